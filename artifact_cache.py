@@ -0,0 +1,52 @@
+# artifact_cache.py
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from cache_store import DiskCache
+from config import ARTIFACT_CACHE_ENABLED, ARTIFACT_CACHE_PATH, ARTIFACT_CACHE_MAX_ENTRIES, ARTIFACT_CACHE_MAX_BYTES, ARTIFACT_CACHE_TTL_SECONDS
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+class ArtifactCache:
+    """Two-level cache for deterministic code tasks.
+
+    Level 1 maps (task description, input schema, output schema) to code that has run successfully.
+    Level 2 maps (code hash, inputs hash) to the output that code printed for those inputs."""
+
+    def __init__(self, path: str = ARTIFACT_CACHE_PATH, max_entries: int = ARTIFACT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = ARTIFACT_CACHE_MAX_BYTES, ttl_seconds: Optional[float] = ARTIFACT_CACHE_TTL_SECONDS):
+        self.code = DiskCache(path, namespace="code", max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.outputs = DiskCache(path, namespace="code_output", max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def code_key(task_description: str, input_schema: Dict, output_schema: Dict) -> str:
+        return _hash([task_description, input_schema, output_schema])
+
+    @staticmethod
+    def output_key(code: str, inputs: Dict[str, Any]) -> str:
+        return f"{hashlib.sha256(code.encode()).hexdigest()}:{_hash(inputs)}"
+
+    def get_code(self, task_description: str, input_schema: Dict, output_schema: Dict) -> Optional[str]:
+        return self.code.get(self.code_key(task_description, input_schema, output_schema))
+
+    def put_code(self, task_description: str, input_schema: Dict, output_schema: Dict, code: str):
+        self.code.set(self.code_key(task_description, input_schema, output_schema), code)
+
+    def invalidate_code(self, task_description: str, input_schema: Dict, output_schema: Dict):
+        """Drops code that failed, so the next run generates it again."""
+        self.code.delete(self.code_key(task_description, input_schema, output_schema))
+
+    def get_output(self, code: str, inputs: Dict[str, Any]) -> Optional[str]:
+        return self.outputs.get(self.output_key(code, inputs))
+
+    def put_output(self, code: str, inputs: Dict[str, Any], output: str):
+        self.outputs.set(self.output_key(code, inputs), output)
+
+    def invalidate_output(self, code: str, inputs: Dict[str, Any]):
+        self.outputs.delete(self.output_key(code, inputs))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {"code": self.code.stats(), "outputs": self.outputs.stats()}
+
+artifact_cache = ArtifactCache() if ARTIFACT_CACHE_ENABLED else None
@@ -0,0 +1,107 @@
+# benchmark.py
+"""Offline planner benchmarks against FakeChatModel; no API keys or network needed.
+
+Example: python benchmark.py --subtasks 2,3,5 --depth 2,3 --tasks 20,50 --latency lognormal --execute --output bench.json"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+# The real clients are constructed at import time; they are never called here
+for key in ("PERPLEXITY_API_KEY", "GOOGLE_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(key, "benchmark")
+os.environ["LLM_CACHE_ENABLED"] = "false"
+os.environ["DECOMPOSITION_INDEX_ENABLED"] = "false"
+
+import config
+import rate_limiter
+from dag_executor import PipelinedExecutor
+from fake_chat_model import FakeChatModel
+from metrics import metrics
+from orchestration import a_generate_task_tree
+from schemas import Task
+from task_manager import TaskManager
+
+def install_fake_model(fake: FakeChatModel, rate_limits: bool):
+    """Points every routed provider at the fake model, with caching off and (optionally) no rate limits."""
+    for chat_model in config.chat_models.values():
+        chat_model.model = fake
+        chat_model.cache = None
+    rate_limiter.reset_limiters()
+    if not rate_limits:
+        for provider in config.chat_models:
+            rate_limiter.set_limiter(provider, rate_limiter.ProviderLimiter(10 ** 9, 10 ** 9))
+
+async def run_once(max_subtasks: int, max_depth: int, max_tasks: int, execute: bool, stream: bool, model_options: Dict[str, Any], rate_limits: bool) -> Dict[str, Any]:
+    fake = FakeChatModel(fanout=max_subtasks, **model_options)
+    install_fake_model(fake, rate_limits)
+    task_manager = TaskManager(max_tasks=max_tasks)
+    tracemalloc.start()
+    started = time.perf_counter()
+    root_task, tasks_by_depth = await a_generate_task_tree(
+        "Benchmark prompt", Task.model_json_schema(), task_manager, max_depth=max_depth,
+        executor=PipelinedExecutor() if execute else None, reuse_decompositions=False, max_subtasks=max_subtasks, stream=stream)
+    wall_time = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "max_subtasks": max_subtasks,
+        "max_depth": max_depth,
+        "max_tasks": max_tasks,
+        "tasks": task_manager.get_task_count(),
+        "tree_depth": max(tasks_by_depth) if tasks_by_depth else None,
+        "wall_time_s": round(wall_time, 3),
+        "llm_calls": fake.calls,
+        "calls_per_task": round(fake.calls / max(task_manager.get_task_count(), 1), 2),
+        "calls_by_type": fake.calls_by_type,
+        "provider_failures": fake.failures,
+        "peak_llm_concurrency": fake.peak_concurrency,
+        "peak_memory_kb": peak_memory // 1024,
+    }
+
+def parse_ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subtasks", type=parse_ints, default=[config.MAX_SUBTASKS], help="MAX_SUBTASKS values (comma separated); also the fake fan-out")
+    parser.add_argument("--depth", type=parse_ints, default=[config.MAX_DEPTH], help="MAX_DEPTH values")
+    parser.add_argument("--tasks", type=parse_ints, default=[config.MAX_TASKS], help="MAX_TASKS values")
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="fixed")
+    parser.add_argument("--latency-seconds", type=float, default=0.05, help="Mean (fixed/uniform) or median (lognormal) call latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of calls failing with a transient error")
+    parser.add_argument("--parse-failure-rate", type=float, default=0.0, help="Share of replies that are malformed")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--execute", action="store_true", help="Also execute the leaves (tool B, through the fake model)")
+    parser.add_argument("--stream", action="store_true", help="Stream decomposition replies and expand subtasks as they arrive")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the configured provider rate limits")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the planner's own output")
+    args = parser.parse_args()
+
+    # Backoff is part of what is measured, but keep it short enough for failure-rate sweeps
+    rate_limiter.BACKOFF_BASE_SECONDS = min(rate_limiter.BACKOFF_BASE_SECONDS, args.latency_seconds)
+    model_options = {"latency": args.latency, "latency_seconds": args.latency_seconds,
+                     "failure_rate": args.failure_rate, "parse_failure_rate": args.parse_failure_rate}
+    results = []
+    for max_subtasks, max_depth, max_tasks in itertools.product(args.subtasks, args.depth, args.tasks):
+        for repeat in range(args.repeat):
+            model_options["seed"] = repeat
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull) if not args.verbose else contextlib.nullcontext():
+                result = asyncio.run(run_once(max_subtasks, max_depth, max_tasks, args.execute, args.stream, model_options, args.rate_limits))
+            results.append(result)
+            print(f"subtasks={max_subtasks} depth={max_depth} tasks={max_tasks} run={repeat}: "
+                  f"{result['tasks']} tasks, {result['llm_calls']} calls, {result['wall_time_s']}s, "
+                  f"peak concurrency {result['peak_llm_concurrency']}, peak memory {result['peak_memory_kb']} KiB")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"results": results, "metrics": metrics.summary()}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# cache_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+class DiskCache:
+    """SQLite-backed key/value store with TTL expiry and size-bounded LRU eviction.
+
+    Values must be JSON serializable. A namespace lets several caches share one database file, which is
+    only opened (and its directory created) on first use. Calls block on SQLite; call them from a worker
+    thread (asyncio.to_thread) when on an event loop."""
+
+    def __init__(self, path: str, namespace: str = "default", max_entries: int = 10000,
+                 max_bytes: int = 100 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        """The database connection, opened on first use (lock held)."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, last_access)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._db().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                    self._db().commit()
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._db().execute(
+                "UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ?", (now, self.namespace, key)
+            )
+            self._db().commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        """Stores value under key and evicts expired and least recently used entries."""
+        serialized = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, serialized, len(serialized), now, now),
+            )
+            self._evict(now)
+            self._db().commit()
+
+    def items(self) -> Dict[str, Any]:
+        """Returns every unexpired entry in this namespace, without touching access times or counters."""
+        now = time.time()
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT key, value, created_at FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value, created_at in rows if not self._expired(created_at, now)}
+
+    def delete(self, key: str):
+        """Removes key from the cache if present."""
+        with self._lock:
+            self._db().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self._db().commit()
+
+    def clear(self):
+        """Removes every entry in this namespace."""
+        with self._lock:
+            self._db().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+            self._db().commit()
+
+    def _evict(self, now: float):
+        if self.ttl_seconds is not None:
+            cursor = self._db().execute(
+                "DELETE FROM cache WHERE namespace = ? AND created_at < ?", (self.namespace, now - self.ttl_seconds)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+        count, total_bytes = self._db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        rows = self._db().execute(
+            "SELECT key, size FROM cache WHERE namespace = ? ORDER BY last_access ASC", (self.namespace,)
+        ).fetchall()
+        for key, size in rows:
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._db().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            count -= 1
+            total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            count, total_bytes = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total_bytes,
+        }
@@ -1,4 +1,4 @@
-import React, { useState, useCallback, useMemo, useRef } from 'react';
+import React, { useState, useCallback, useMemo, useRef, useEffect } from 'react';
 import {
   ReactFlow,
   addEdge,
@@ -20,6 +20,7 @@ import BranchedEdge from './components/BranchedEdge';
 import SubtaskNode from './components/SubtaskNode';
 import RightSidebar from './components/RightSidebar';
 import dummyTasks from './dummydata.json';
+import useStore, { buildTree } from './store';
 
 console.log('Loaded dummy tasks:', dummyTasks);
 
@@ -183,6 +184,9 @@ function App() {
   const [selectedNode, setSelectedNode] = useState(null);
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
   const reactFlowInstance = useRef(null);
+  const streamTaskTree = useStore((state) => state.streamTaskTree);
+  const streamedTasks = useStore((state) => state.tasks);
+  const streamedRootId = useStore((state) => state.rootId);
 
   // Function to create nodes and edges based on task data
   const createNodesAndEdges = (taskData) => {
@@ -540,11 +544,23 @@ function App() {
     }, 100);
   };
 
+  // Redraw the graph whenever a streamed delta changes the tree
+  useEffect(() => {
+    const root = streamedRootId && buildTree(streamedTasks, streamedRootId);
+    if (root) {
+      createNodesAndEdges(root.subtasks);
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [streamedTasks, streamedRootId]);
+
   // Function to handle send button click
   const handleSendClick = () => {
     if (prompt.trim()) {
-      console.log('Handling send click with dummy tasks:', dummyTasks.subtasks);
-      createNodesAndEdges(dummyTasks.subtasks);
+      // Nodes appear as the server plans them; fall back to the dummy tasks if the server is unavailable
+      streamTaskTree(prompt).catch((error) => {
+        console.error('Streaming task tree failed, showing dummy tasks:', error);
+        createNodesAndEdges(dummyTasks.subtasks);
+      });
       // Keeping prompt in the text bar
     }
   };
@@ -1,11 +1,98 @@
 // store.js
 import create from 'zustand';
 
-const useStore = create((set) => ({
+const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
+
+// Applies one delta from /api/jobs/<id>/events to the flat task map
+const applyDelta = (tasks, delta) => {
+    switch (delta.type) {
+        case 'node_added': {
+            const next = { ...tasks, [delta.task.task_id]: { ...delta.task, subtasks: [] } };
+            const parent = delta.parent_id && next[delta.parent_id];
+            if (parent) {
+                next[delta.parent_id] = { ...parent, subtasks: [...parent.subtasks, delta.task.task_id] };
+            }
+            return next;
+        }
+        case 'tool_selected':
+        case 'result_ready': {
+            const task = tasks[delta.task_id];
+            if (!task) return tasks;
+            const { seq, type, task_id, ...fields } = delta;
+            if (type === 'tool_selected') fields.selected_tool = fields.tool;
+            return { ...tasks, [task_id]: { ...task, ...fields } };
+        }
+        default:
+            return tasks;
+    }
+};
+
+// Rebuilds the nested task tree (the shape returned by /api/generate_task_tree) from the flat map
+export const buildTree = (tasks, taskId) => {
+    const task = tasks[taskId];
+    if (!task) return null;
+    return { ...task, subtasks: task.subtasks.map((id) => buildTree(tasks, id)).filter(Boolean) };
+};
+
+const useStore = create((set, get) => ({
     nodes: [],
     edges: [],
     setNodes: (nodes) => set({ nodes }),
     setEdges: (edges) => set({ edges }),
+
+    // Streaming task tree state
+    jobId: null,
+    jobStatus: null,
+    rootId: null,
+    tasks: {},
+    lastSeq: 0,
+    eventSource: null,
+
+    // Submits a prompt as a job and applies its deltas as they arrive
+    streamTaskTree: async (prompt) => {
+        get().stopStream();
+        const response = await fetch(`${API_URL}/api/jobs`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ prompt }),
+        });
+        const job = await response.json();
+        if (!response.ok) {
+            set({ jobStatus: 'failed' });
+            throw new Error(job.error || `Job submission failed (${response.status})`);
+        }
+        set({ jobId: job.job_id, jobStatus: job.status, rootId: null, tasks: {}, lastSeq: 0 });
+        get().connectStream();
+    },
+
+    // Opens (or reopens) the event stream from the last sequence number seen
+    connectStream: () => {
+        const { jobId, lastSeq } = get();
+        if (!jobId) return;
+        // The browser resends Last-Event-ID on automatic reconnects; ?since covers manual ones
+        const eventSource = new EventSource(`${API_URL}/api/jobs/${jobId}/events?since=${lastSeq}`);
+        const onDelta = (message) => {
+            const delta = JSON.parse(message.data);
+            if (delta.seq <= get().lastSeq) return;
+            set((state) => ({
+                lastSeq: delta.seq,
+                tasks: applyDelta(state.tasks, delta),
+                rootId: state.rootId || (delta.type === 'node_added' && !delta.parent_id ? delta.task.task_id : null),
+                jobStatus: delta.type === 'status' ? delta.status : state.jobStatus,
+            }));
+            if (delta.type === 'status' && (delta.status === 'succeeded' || delta.status === 'failed')) {
+                get().stopStream();
+            }
+        };
+        ['node_added', 'tool_selected', 'result_ready', 'status'].forEach((type) => eventSource.addEventListener(type, onDelta));
+        set({ eventSource });
+    },
+
+    stopStream: () => {
+        const { eventSource } = get();
+        if (eventSource) eventSource.close();
+        set({ eventSource: null });
+    },
 }));
 
 export default useStore;
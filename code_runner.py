@@ -0,0 +1,148 @@
+# code_runner.py
+import asyncio
+import json
+import os
+import sys
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from config import CODE_WORKERS, CODE_TIMEOUT_SECONDS, CODE_WORKER_MAX_JOBS, CODE_WORKER_MEMORY_MB, CODE_WORKER_CPU_SECONDS, CODE_WORKER_SPAWN_ATTEMPTS, BACKOFF_BASE_SECONDS
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_worker.py")
+MAX_OUTPUT_BYTES = 16 * 1024 * 1024  # Longest response line accepted from a worker
+
+@dataclass
+class CodeResult:
+    stdout: str
+    error: Optional[str] = None
+
+class CodeWorker:
+    """One pre-started Python process that runs generated code jobs sent over its stdin."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.jobs = 0
+
+    @classmethod
+    async def start(cls, memory_mb: int, cpu_seconds: int) -> "CodeWorker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", WORKER_SCRIPT, str(memory_mb), str(cpu_seconds),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=MAX_OUTPUT_BYTES,
+        )
+        return cls(process)
+
+    async def run(self, code: str, inputs: Dict[str, Any]) -> CodeResult:
+        self.jobs += 1
+        self.process.stdin.write((json.dumps({"code": code, "inputs": inputs}) + "\n").encode())
+        await self.process.stdin.drain()
+        line = await self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("Worker exited while running the job (memory or CPU limit exceeded?)")
+        response = json.loads(line)
+        return CodeResult(stdout=response["stdout"], error=response["error"])
+
+    async def stop(self):
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+
+class CodeWorkerPool:
+    """Pool of warm, resource-limited worker processes for executing generated code.
+
+    Each job gets a timeout; a worker that times out or dies is replaced, and every worker is
+    recycled after max_jobs_per_worker jobs so state leaked by generated code does not accumulate.
+    A replacement that cannot be started is retried with backoff; once no worker is left, jobs fail
+    immediately instead of waiting for a worker that will never come."""
+
+    def __init__(self, size: int = CODE_WORKERS, timeout: float = CODE_TIMEOUT_SECONDS,
+                 max_jobs_per_worker: int = CODE_WORKER_MAX_JOBS, memory_mb: int = CODE_WORKER_MEMORY_MB,
+                 cpu_seconds: int = CODE_WORKER_CPU_SECONDS):
+        self.size = size
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self._idle: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self.live = 0  # Workers idle, busy or being replaced
+
+    async def start(self):
+        """Pre-starts the workers; called automatically by the first run()."""
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            workers = await asyncio.gather(*(self._new_worker() for _ in range(self.size)))
+            self._idle = asyncio.Queue()
+            for worker in workers:
+                self._idle.put_nowait(worker)
+            self.live = len(workers)
+
+    async def _new_worker(self) -> CodeWorker:
+        return await CodeWorker.start(self.memory_mb, self.cpu_seconds)
+
+    async def run(self, code: str, inputs: Dict[str, Any] = None) -> CodeResult:
+        """Runs code with `inputs` defined and returns what it printed."""
+        await self.start()
+        if self.live == 0:
+            return CodeResult(stdout="", error="No code worker is available, every restart failed")
+        worker = await self._idle.get()
+        if worker is None:  # Woken by the last slot being given up
+            self._idle.put_nowait(None)  # Wake the next waiter too
+            return CodeResult(stdout="", error="No code worker is available, every restart failed")
+        healthy = False
+        try:
+            result = await asyncio.wait_for(worker.run(code, inputs or {}), self.timeout)
+            healthy = True
+            return result
+        except asyncio.TimeoutError:
+            return CodeResult(stdout="", error=f"Code execution timed out after {self.timeout} seconds")
+        except (RuntimeError, ValueError, OSError) as e:
+            return CodeResult(stdout="", error=str(e))
+        finally:
+            if healthy and worker.jobs < self.max_jobs_per_worker:
+                self._idle.put_nowait(worker)
+            else:
+                # Replace the worker in the background so the caller is not delayed by interpreter startup
+                asyncio.create_task(self._replace(worker))
+
+    async def _replace(self, worker: CodeWorker):
+        await worker.stop()
+        for attempt in range(CODE_WORKER_SPAWN_ATTEMPTS):
+            try:
+                self._idle.put_nowait(await self._new_worker())
+                return
+            except OSError as e:
+                print(f"Failed to start code worker (attempt {attempt + 1} of {CODE_WORKER_SPAWN_ATTEMPTS}): {e}")
+            if attempt < CODE_WORKER_SPAWN_ATTEMPTS - 1:
+                await asyncio.sleep(BACKOFF_BASE_SECONDS * 2 ** attempt)
+        self.live -= 1
+        if self.live == 0:
+            self._idle.put_nowait(None)  # Jobs already waiting for a worker must not wait forever
+
+    async def close(self):
+        """Stops every idle worker."""
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            worker = self._idle.get_nowait()
+            if worker is not None:
+                await worker.stop()
+        self._idle = None
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, CodeWorkerPool]" = weakref.WeakKeyDictionary()
+
+def get_code_worker_pool() -> CodeWorkerPool:
+    """Returns the worker pool of the running event loop (worker pipes are bound to their loop)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _pools:
+        _pools[loop] = CodeWorkerPool()
+    return _pools[loop]
+
+async def close_code_worker_pool():
+    """Stops the workers of the running event loop's pool, if any."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool:
+        await pool.close()
@@ -0,0 +1,65 @@
+# code_worker.py
+"""Long-lived sandboxed worker that runs generated code for code_runner.CodeWorkerPool.
+
+Reads one JSON job per line ({"code": ..., "inputs": ...}) and answers with one JSON line
+({"stdout": ..., "error": ...}). Started as: python code_worker.py <memory_mb> <cpu_seconds>"""
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; the pool's timeout still applies
+    resource = None
+
+def apply_memory_limit(memory_mb: int):
+    if resource and memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def apply_cpu_limit(cpu_seconds: int):
+    """Allows the next job cpu_seconds of CPU time on top of what the worker has used so far."""
+    if resource and cpu_seconds > 0:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        soft = used + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def run_job(job: dict) -> dict:
+    stdout = io.StringIO()
+    namespace = {"__name__": "__main__", "inputs": job.get("inputs") or {}, "json": json}
+    try:
+        with contextlib.redirect_stdout(stdout):
+            exec(compile(job["code"], "<generated>", "exec"), namespace)
+        return {"stdout": stdout.getvalue(), "error": None}
+    except BaseException:
+        return {"stdout": stdout.getvalue(), "error": traceback.format_exc(limit=5)}
+
+def main():
+    memory_mb, cpu_seconds = int(sys.argv[1]), int(sys.argv[2])
+    # Keep private copies of the protocol pipes so generated code cannot read or corrupt them
+    protocol_in = os.fdopen(os.dup(0), "r")
+    protocol_out = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    apply_memory_limit(memory_mb)
+    for line in protocol_in:
+        job = json.loads(line)
+        apply_cpu_limit(cpu_seconds)
+        result = run_job(job)
+        try:
+            response = json.dumps(result)
+        except (TypeError, ValueError) as e:
+            response = json.dumps({"stdout": "", "error": f"Unserializable result: {e}"})
+        protocol_out.write(response + "\n")
+        protocol_out.flush()
+
+if __name__ == "__main__":
+    main()
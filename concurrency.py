@@ -0,0 +1,77 @@
+# concurrency.py
+import asyncio
+import heapq
+import itertools
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Tuple
+from config import CHAT_PROVIDER, PROVIDER_CONCURRENCY, MAX_CONCURRENT_EXECUTIONS, EVALUATION_CONCURRENCY
+
+DEFAULT_PROVIDER_CONCURRENCY = 4
+
+class PrioritySemaphore:
+    """Semaphore that hands free slots to the highest-priority waiter instead of the longest-waiting one."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: List[Tuple[float, int, asyncio.Future]] = []
+        self._order = itertools.count()  # Keeps equal priorities first-come, first-served
+
+    async def acquire(self, priority: float = 0.0):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # The slot was handed over just as we were cancelled; pass it on
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # The slot moves straight to the waiter, active is unchanged
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: float = 0.0):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+# Semaphores are bound to the loop they are first used on, so keep one set per event loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+def _loop_semaphore(name: str, limit: int) -> asyncio.Semaphore:
+    """Returns a semaphore for the running event loop, creating it on first use."""
+    loop_semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if name not in loop_semaphores:
+        loop_semaphores[name] = asyncio.Semaphore(limit)
+    return loop_semaphores[name]
+
+def provider_semaphore(provider: str = CHAT_PROVIDER) -> PrioritySemaphore:
+    """Limits the number of concurrent LLM calls sent to a provider, giving free slots to the highest-priority call."""
+    loop_semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    name = f"provider:{provider}"
+    if name not in loop_semaphores:
+        loop_semaphores[name] = PrioritySemaphore(PROVIDER_CONCURRENCY.get(provider, DEFAULT_PROVIDER_CONCURRENCY))
+    return loop_semaphores[name]
+
+def evaluation_semaphore() -> asyncio.Semaphore:
+    """Limits the number of decomposition evaluations running in the background."""
+    return _loop_semaphore("evaluation", EVALUATION_CONCURRENCY)
+
+def execution_slots() -> PrioritySemaphore:
+    """Limits the number of leaf tasks executing at once, giving free slots to the highest-priority leaf."""
+    loop_semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if "execution" not in loop_semaphores:
+        loop_semaphores["execution"] = PrioritySemaphore(MAX_CONCURRENT_EXECUTIONS)
+    return loop_semaphores["execution"]
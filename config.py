@@ -58,7 +58,58 @@ class CustomChatOpenAI(ChatOpenAI):
 
 openai_model = CustomChatOpenAI(api_key=OPENAI_API_KEY)
 
-chat_model = perplexity_model
+# Persistent LLM response cache
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_SEARCH_TTL_SECONDS = float(os.getenv("LLM_CACHE_SEARCH_TTL_SECONDS", "3600"))  # Web search models (Perplexity) answer from live results
+
+from cache_store import DiskCache
+from llm_cache import CachedChatModel
+
+# The database file is only opened on the first cache access
+llm_cache = DiskCache(
+    LLM_CACHE_PATH,
+    namespace="llm",
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_bytes=LLM_CACHE_MAX_BYTES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+) if LLM_CACHE_ENABLED else None
+search_llm_cache = DiskCache(
+    LLM_CACHE_PATH,
+    namespace="llm_search",
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_bytes=LLM_CACHE_MAX_BYTES,
+    ttl_seconds=LLM_CACHE_SEARCH_TTL_SECONDS,
+) if LLM_CACHE_ENABLED else None
+
+# One cached model per provider; calls are routed between them by call type (model_router.py)
+chat_models = {
+    "perplexity": CachedChatModel(perplexity_model, search_llm_cache),
+    "gemini": CachedChatModel(gemini_model, llm_cache),
+    "openai": CachedChatModel(openai_model, llm_cache),
+}
+
+# Cache of validated generated code and its outputs
+ARTIFACT_CACHE_ENABLED = os.getenv("ARTIFACT_CACHE_ENABLED", "true").lower() == "true"
+ARTIFACT_CACHE_PATH = os.getenv("ARTIFACT_CACHE_PATH", ".cache/artifacts.sqlite")
+ARTIFACT_CACHE_MAX_ENTRIES = int(os.getenv("ARTIFACT_CACHE_MAX_ENTRIES", "5000"))
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+ARTIFACT_CACHE_TTL_SECONDS = float(os.getenv("ARTIFACT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Persistent index of accepted decompositions, reused across requests
+DECOMPOSITION_INDEX_ENABLED = os.getenv("DECOMPOSITION_INDEX_ENABLED", "true").lower() == "true"
+DECOMPOSITION_INDEX_PATH = os.getenv("DECOMPOSITION_INDEX_PATH", ".cache/decompositions.sqlite")
+DECOMPOSITION_INDEX_MAX_ENTRIES = int(os.getenv("DECOMPOSITION_INDEX_MAX_ENTRIES", "2000"))
+DECOMPOSITION_INDEX_TTL_SECONDS = float(os.getenv("DECOMPOSITION_INDEX_TTL_SECONDS", str(30 * 24 * 3600)))
+DECOMPOSITION_REUSE_THRESHOLD = 0.9  # TF-IDF cosine similarity needed to reuse a stored decomposition
+
+# Record/replay journal of external interactions (model calls, code execution, VM steps), see journal.py
+JOURNAL_MODE = os.getenv("JOURNAL_MODE", "off").lower()  # off, record or replay
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", ".cache/journal.jsonl")
+JOURNAL_REPLAY_LATENCY = os.getenv("JOURNAL_REPLAY_LATENCY", "recorded").lower()  # recorded or zero
 
 # Model configurations
 perplexity_config = {
@@ -73,25 +124,122 @@ gemini_config = {
     "top_p": 0.9
 }
 
+# Tool letters, as offered by the selection rubric (llm_interaction.TOOL_SELECTION_GUIDELINES) and run by task_execution.execute_task
+CODE_TOOL = "A"  # Deterministic code, run in the code worker pool
+LLM_TOOL = "B"  # LLM search & reasoning
+COMPUTER_USE_TOOL = "C"  # Computer use agent on a leased VM
+DECOMPOSE_TOOL = "D"  # Mix of tools: decomposed into subtasks, never executed
+TOOLS = [CODE_TOOL, LLM_TOOL, COMPUTER_USE_TOOL, DECOMPOSE_TOOL]
+
 # Configuration parameters (can be overwritten by command line arguments or other environment variables)
 MAX_TASKS = 20
-SIMILARITY_THRESHOLD = 0.8
+SIMILARITY_THRESHOLD = 0.8  # TF-IDF cosine similarity above which subtasks are merged
+SUBTASK_DEDUP_ENABLED = True
+STREAM_DECOMPOSITION = os.getenv("STREAM_DECOMPOSITION", "false").lower() == "true"  # Expand each subtask as soon as the streamed reply closes it, for one extra selection call per decomposition
 MAX_RETRIES = 5
+SELECTION_FALLBACK_TOOL = LLM_TOOL  # Tool given to a sibling whose batched and individual tool selections both failed
 MAX_DEPTH = 5
 MAX_SUBTASKS = 5
+PARENT_CONTEXT_TOKEN_BUDGET = 256  # Ancestor summaries sent with each decomposition, whatever the depth
+NODE_SUMMARY_TOKENS = 64  # Length of each ancestor's summary
+
+# Deadline- and budget-aware planning (planning_budget.py)
+BUDGET_RESERVE_AT_ROOT = 0.1  # Share of the budget that must remain to decompose the root
+BUDGET_RESERVE_AT_MAX_DEPTH = 0.5  # ... and to decompose a node at MAX_DEPTH, linear in between
+BUDGET_LOW_VALUE_FACTOR = 2.0  # Reserve multiplier for branches that produce none of their parent's outputs
+BUDGET_LEAF_TOOL = LLM_TOOL  # Tool given to nodes planned as leaves instead of being decomposed
+
+# Decomposition quality evaluation (evaluation.py), run in the background while the tree is planned
+EVALUATION_ENABLED = os.getenv("EVALUATION_ENABLED", "true").lower() == "true"
+EVALUATION_SAMPLE_RATE = float(os.getenv("EVALUATION_SAMPLE_RATE", "0.1"))  # Share of decomposition steps scored for jobs
+EVALUATION_CONCURRENCY = 2  # Maximum evaluations in flight, so scoring never crowds out planning calls
+CALL_PRIORITIES = {"evaluation": -1.0}  # Provider slots go to higher priorities first; other call types are 0
+
+# Concurrency limits for tree generation
+CHAT_PROVIDER = "perplexity"  # Default provider for model calls
+chat_model = chat_models[CHAT_PROVIDER]
+PROVIDER_CONCURRENCY = {  # Maximum in-flight LLM calls per provider
+    "perplexity": 4,
+    "gemini": 8,
+    "openai": 8,
+}
+MAX_CONCURRENT_EXECUTIONS = 4  # Maximum leaf tasks executing at once
+TOOL_COST_SECONDS = {  # Initial execution time estimates per tool, refined from observed latencies
+    CODE_TOOL: 5.0,
+    LLM_TOOL: 15.0,
+    COMPUTER_USE_TOOL: 120.0,
+    DECOMPOSE_TOOL: 0.0,  # Never executed
+}
+LATENCY_EWMA_ALPHA = 0.3  # Weight of each new observation in the latency estimates
+
+# Metrics (metrics.py, served at /metrics)
+MODEL_PRICING = {  # USD per million prompt/completion tokens, for cost estimates
+    "perplexity": {"prompt": 3.0, "completion": 15.0},
+    "gemini": {"prompt": 0.1, "completion": 0.4},
+    "openai": {"prompt": 0.5, "completion": 1.5},
+}
+LATENCY_BUCKETS_SECONDS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+METRICS_MAX_REQUESTS = 200  # Requests whose individual metrics are kept
+
+# Model routing by call type (see llm_interaction.py for the call types). Every call type goes to
+# CHAT_PROVIDER unless routed elsewhere, e.g. MODEL_ROUTES="select=gemini,select_batch=gemini"
+MODEL_ROUTES = {
+    "default": CHAT_PROVIDER,
+    **{call_type.strip(): provider.strip() for call_type, provider in
+       (route.split("=", 1) for route in os.getenv("MODEL_ROUTES", "").split(",") if route.strip())},
+}
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"  # Race a backup provider when a call is slow
+HEDGE_PROVIDERS = {  # Backup provider for each routed provider
+    "perplexity": "openai",
+    "gemini": "perplexity",
+    "openai": "perplexity",
+}
+HEDGE_PERCENTILE = 95  # Hedge once a call has run longer than this percentile of recent latencies
+HEDGE_MIN_SAMPLES = 20  # Latency samples needed before the percentile is trusted
+HEDGE_DEFAULT_DELAY_SECONDS = 10.0  # Hedge delay until then
+HEDGE_LATENCY_WINDOW = 200  # Recent latencies kept per provider
+
+# Rate limiting, backoff and circuit breaking for model calls
+RATE_LIMITS = {  # Per provider request and token budgets
+    "perplexity": {"requests_per_minute": 50, "tokens_per_minute": 200000},
+    "gemini": {"requests_per_minute": 60, "tokens_per_minute": 1000000},
+    "openai": {"requests_per_minute": 500, "tokens_per_minute": 200000},
+}
+DEFAULT_RATE_LIMIT = {"requests_per_minute": 50, "tokens_per_minute": 100000}
+MODEL_CALL_RETRIES = 5  # Attempts for transient provider errors (429, 5xx, timeouts)
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failures before a provider's circuit opens
+CIRCUIT_RESET_SECONDS = 30.0  # Time before a trial call is let through an open circuit
+
+# Warm worker pool for generated code (deterministic code tasks)
+CODE_WORKERS = 2  # Pre-started worker processes
+CODE_TIMEOUT_SECONDS = 10  # Wall-clock limit per job
+CODE_WORKER_MAX_JOBS = 50  # Jobs before a worker is recycled
+CODE_WORKER_MEMORY_MB = 2048  # Address space limit per worker
+CODE_WORKER_CPU_SECONDS = 10  # CPU time limit per job
+CODE_WORKER_SPAWN_ATTEMPTS = 4  # Attempts to restart a worker (with exponential backoff) before its slot is given up
+
+# Asynchronous job API (new_main.py)
+JOB_QUEUE_SIZE = 20  # Jobs waiting to start before new submissions get HTTP 429
+JOB_CONCURRENCY = 4  # Task trees generated at once
+JOB_RETENTION_SECONDS = 3600  # How long finished jobs stay available
+SYNC_GENERATE_TIMEOUT_SECONDS = 300  # How long /api/generate_task_tree waits before answering 202 with the job id
+
+# Warm VM pool for computer-use tasks
+VM_POOL_SIZE = 2  # Instances kept booted
+VM_POOL_MAX_LEASES = 10  # Leases before an instance is replaced
+VM_POOL_PREWARM = False  # Boot the pool when the job server starts instead of on first use
+VM_TIMEOUT_HOURS = 1
+VM_RESET_COMMAND = "pkill -f chrom; pkill -f firefox; rm -rf /tmp/scrapybara-*; true"  # Run between leases
 
 
 import re
 import json
-import regex
+from json_stream import extract_json_object
 def clean_json(task_json_string: str) -> str:
     json_content = re.search(r'```json\n(.*?)\n```', task_json_string, re.DOTALL)
     if json_content:
         return json_content.group(1)
     else:
-        pattern = r'\{(?:[^{}]|(?R))*\}'
-        match = regex.search(pattern, task_json_string)
-        if match:
-            return match.group()
-        else:
-            return ""
\ No newline at end of file
+        return extract_json_object(task_json_string) # Linear scan, no backtracking on long or malformed replies
\ No newline at end of file
@@ -0,0 +1,104 @@
+# dag_executor.py
+import asyncio
+import time
+from typing import Dict, List, Optional
+from concurrency import execution_slots
+from link_registry import LinkRegistry
+from task_execution import execute_task
+from tree_utils import iter_tasks
+from task_tree import TaskTree
+from task_events import TaskEventLog
+from scheduler import CriticalPathScheduler, latency_history
+from metrics import metrics
+
+def is_executable(task: Dict) -> bool:
+    """Leaves are the tasks with a tool other than D (Mix of Tools). Merged duplicates reuse another task's execution."""
+    return bool(task.get('selected_tool')) and task['selected_tool'] != 'D' and not task.get('duplicate_of')
+
+def executable_tasks(root_task: Dict) -> List[Dict]:
+    """Returns the leaf tasks of a tree."""
+    return [task for task in iter_tasks(root_task) if is_executable(task)]
+
+async def run_task(task: Dict, links: LinkRegistry, events: TaskEventLog = None, scheduler: CriticalPathScheduler = None):
+    """Executes one leaf once all of its ingested links are ready; with a scheduler, critical-path leaves get slots first."""
+    try:
+        inputs = await links.wait_for_inputs(task)
+        priority = scheduler.priority(task) if scheduler else 0.0
+        async with execution_slots().slot(priority):  # Only hold an execution slot once the inputs are available
+            started = time.monotonic()
+            with metrics.timer(f"tool_{task['selected_tool']}"):
+                task['result'] = await execute_task(task, inputs, links)
+            latency_history.record(task['selected_tool'], time.monotonic() - started)
+        task['completed'] = True
+    except asyncio.CancelledError:
+        task['result'] = "Execution cancelled"
+        raise
+    except Exception as e:
+        task['result'] = f"General execution error: {e}"
+    finally:
+        links.resolve_produced(task)
+        links.write_back([task])
+        if events:
+            events.result_ready(task)
+
+class PipelinedExecutor:
+    """Starts leaves as soon as they are submitted, so execution overlaps with planning of the rest of the tree.
+
+    Leaves whose producers have not been planned yet simply wait on their links; finish() releases links
+    that nothing produces once planning is over and waits for every running leaf."""
+
+    def __init__(self, links: LinkRegistry = None, events: TaskEventLog = None):
+        self.links = links or LinkRegistry()
+        self.events = events
+        self.scheduler = CriticalPathScheduler(self.links)
+        self.running: List[asyncio.Task] = []
+        self.cancelled = 0  # Leaves stopped by finish()'s timeout
+
+    def submit(self, task: Dict):
+        """Registers a planned leaf and starts it in the background."""
+        self.links.register_task(task)
+        for link_id in self.scheduler.add(task):
+            self.links.release(link_id)
+        self.running.append(asyncio.create_task(run_task(task, self.links, self.events, self.scheduler)))
+
+    def merge(self, duplicate: Dict, canonical: Dict):
+        """Lets consumers of a merged duplicate read the outputs of the canonical task instead."""
+        self.links.merge_task(duplicate, canonical)
+
+    async def finish(self, root_task: Dict = None, timeout: Optional[float] = None) -> LinkRegistry:
+        """Called once planning has drained; waits for the execution stage to drain too.
+
+        Leaves still running after timeout seconds are cancelled; their outputs are released as None."""
+        self.links.close()
+        critical_path = self.scheduler.critical_path()
+        if critical_path:
+            print(f"Estimated critical path: {' -> '.join(critical_path)} ({self.scheduler.priority({'task_id': critical_path[0]}):.0f}s)")
+        if self.running:
+            _, pending = await asyncio.wait(self.running, timeout=timeout)
+            if pending:
+                print(f"Cancelling {len(pending)} leaves still running at the deadline")
+                self.cancelled += len(pending)
+                for running_task in pending:
+                    running_task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        await asyncio.gather(*self.links.forwards)
+        if root_task:
+            self.links.write_back(list(iter_tasks(root_task)))
+        return self.links
+
+    def cancel(self):
+        """Stops every running leaf, e.g. when planning failed."""
+        for running_task in self.running:
+            running_task.cancel()
+
+async def execute_task_tree(root_task: Dict, links: LinkRegistry = None) -> LinkRegistry:
+    """Executes every leaf of a fully planned tree as soon as its inputs are ready, running independent branches in parallel."""
+    executor = PipelinedExecutor(links)
+    tree = TaskTree.from_dict(root_task)
+    for task in tree:
+        canonical = tree.get(task['duplicate_of']) if task.get('duplicate_of') else None
+        if canonical is not None:
+            executor.merge(task, canonical)
+    for task in executable_tasks(root_task):
+        executor.submit(task)
+    return await executor.finish(root_task)
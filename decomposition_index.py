@@ -0,0 +1,151 @@
+# decomposition_index.py
+import copy
+import hashlib
+import re
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional
+from jsonschema import ValidationError
+from schema_validation import validate
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from cache_store import DiskCache
+from config import DECOMPOSITION_INDEX_ENABLED, DECOMPOSITION_INDEX_PATH, DECOMPOSITION_INDEX_MAX_ENTRIES, DECOMPOSITION_INDEX_TTL_SECONDS, DECOMPOSITION_REUSE_THRESHOLD, MAX_SUBTASKS
+
+# Fields of a decomposed subtask worth reusing; everything else is filled in while planning or executing
+SUBTASK_FIELDS = ["task_id", "task_name", "task_description", "ingests", "produces"]
+LINK_FIELDS = ["link_id", "link_name", "link_description", "data_type", "data_source_type"]
+
+_analyze = TfidfVectorizer(stop_words="english").build_analyzer()  # Same tokens as the index's vectorizer
+
+def normalize(task: Dict) -> str:
+    """Lowercases the task name and description and strips punctuation and extra whitespace."""
+    text = f"{task.get('task_name', '')} {task.get('task_description', '')}".lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+def content_tokens(document: str) -> FrozenSet[str]:
+    """The terms of a normalized document that carry meaning, i.e. without English stop words."""
+    return frozenset(_analyze(document))
+
+def _stored_subtask(subtask: Dict) -> Dict:
+    stored = {field: copy.deepcopy(subtask[field]) for field in SUBTASK_FIELDS if field in subtask}
+    for field in ("ingests", "produces"):
+        stored[field] = [{key: link[key] for key in LINK_FIELDS if key in link} for link in stored.get(field, [])]
+    stored["subtasks"] = []
+    return stored
+
+class DecompositionIndex:
+    """Persistent nearest-neighbour index of accepted decompositions, shared across requests.
+
+    Entries map a normalized task to the subtasks it was decomposed into. A task reuses the decomposition of
+    an indexed task that reaches the similarity threshold and has exactly the same content terms, instead of
+    asking the LLM for a new one. TF-IDF alone is not enough: terms the index has never seen are ignored by
+    the vectorizer, so "flights to tokyo" would otherwise match "flights to paris"."""
+
+    def __init__(self, path: str = DECOMPOSITION_INDEX_PATH, threshold: float = DECOMPOSITION_REUSE_THRESHOLD,
+                 max_entries: int = DECOMPOSITION_INDEX_MAX_ENTRIES, ttl_seconds: Optional[float] = DECOMPOSITION_INDEX_TTL_SECONDS):
+        self.store = DiskCache(path, namespace="decomposition", max_entries=max_entries, max_bytes=max_entries * 64 * 1024, ttl_seconds=ttl_seconds)
+        self.threshold = threshold
+        self.lookups = 0
+        self.hits = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._documents: List[str] = []
+        self._tokens: List[FrozenSet[str]] = []
+        self._vectorizer = None
+        self._matrix = None
+        for key, entry in self.store.items().items():
+            self._keys.append(key)
+            self._documents.append(entry["document"])
+            self._tokens.append(content_tokens(entry["document"]))
+
+    def _nearest(self, document: str) -> Optional[str]:
+        """The key of the most similar indexed document with the same content terms as document, if any."""
+        tokens = content_tokens(document)
+        with self._lock:
+            if not self._keys or not tokens:
+                return None
+            if self._vectorizer is None:  # Refit only after the index changed
+                self._vectorizer = TfidfVectorizer(stop_words="english")
+                try:
+                    self._matrix = self._vectorizer.fit_transform(self._documents)
+                except ValueError:  # Empty vocabulary
+                    self._vectorizer = None
+                    return None
+            scores = cosine_similarity(self._vectorizer.transform([document]), self._matrix)[0]
+            for index in scores.argsort()[::-1]:
+                if scores[index] < self.threshold:
+                    break
+                if self._tokens[index] == tokens:
+                    return self._keys[index]
+            return None
+
+    def _forget(self, key: str):
+        with self._lock:
+            if key in self._keys:
+                index = self._keys.index(key)
+                del self._keys[index], self._documents[index], self._tokens[index]
+                self._vectorizer = None
+
+    def lookup(self, task: Dict, schema: Dict, max_subtasks: int = MAX_SUBTASKS) -> Optional[List[Dict]]:
+        """Returns a copy of the decomposition stored for the nearest indexed task, re-validated and with ids
+        rewritten for this tree, or None when nothing close enough is indexed or it has more than max_subtasks."""
+        self.lookups += 1
+        key = self._nearest(normalize(task))
+        entry = self.store.get(key) if key else None
+        if key and entry is None:  # Evicted or expired since it was indexed
+            self._forget(key)
+        if entry is None:
+            return None
+        subtasks = graft(task, entry["subtasks"])
+        try:
+            if len(subtasks) > max_subtasks:
+                raise ValueError(f"More than {max_subtasks} subtasks stored.")
+            for subtask in subtasks:
+                validate(instance=subtask, schema=schema)
+        except (ValidationError, ValueError) as e:
+            print(f"Dropping stored decomposition of '{entry['document']}': {e}")
+            self.rejected += 1
+            self.store.delete(key)
+            self._forget(key)
+            return None
+        self.hits += 1
+        print(f"Reusing decomposition of '{entry['document']}' for task {task['task_id']}")
+        return subtasks
+
+    def add(self, task: Dict, subtasks: List[Dict]):
+        """Stores the decomposition of an accepted task."""
+        document = normalize(task)
+        key = hashlib.sha256(document.encode()).hexdigest()
+        self.store.set(key, {"document": document, "subtasks": [_stored_subtask(subtask) for subtask in subtasks]})
+        with self._lock:
+            if key not in self._keys:
+                self._keys.append(key)
+                self._documents.append(document)
+                self._tokens.append(content_tokens(document))
+                self._vectorizer = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "rejected": self.rejected,
+            "entries": len(self._keys),
+            "evictions": self.store.evictions,
+        }
+
+def graft(task: Dict, stored_subtasks: List[Dict]) -> List[Dict]:
+    """Adapts stored subtasks to the task they are grafted under.
+
+    Links named like one of the task's own links take that link's id; links internal to the stored
+    decomposition and task ids are prefixed with the task id so they cannot clash with the rest of the tree."""
+    subtasks = copy.deepcopy(stored_subtasks)
+    task_links = {link["link_name"]: link["link_id"] for link in task.get("ingests", []) + task.get("produces", [])}
+    for subtask in subtasks:
+        subtask["task_id"] = f"{task['task_id']}/{subtask['task_id']}"
+        for link in subtask.get("ingests", []) + subtask.get("produces", []):
+            link["link_id"] = task_links.get(link["link_name"], f"{task['task_id']}/{link['link_id']}")
+    return subtasks
+
+decomposition_index = DecompositionIndex() if DECOMPOSITION_INDEX_ENABLED else None
@@ -1,20 +1,98 @@
-from langchain.evaluation import load_evaluator
-from config import chat_model #Import chat model
+# evaluation.py
+import asyncio
 import json
+import zlib
+from typing import Any, Dict, List, Optional, Set
+from langchain.evaluation import load_evaluator
+from langchain_core.messages import HumanMessage
+from config import chat_model, EVALUATION_SAMPLE_RATE
+from concurrency import evaluation_semaphore
+from llm_interaction import a_invoke_model
+from task_context import prompt_view
 
-def evaluate_task_decomposition(task):
-    evaluator = load_evaluator("criteria",
-    criteria={
+CRITERIA = {
     "completeness": "Does the decomposition cover all aspects of the task?",
     "actionability": "Are the subtasks concrete and actionable?",
     "independence": "Are the subtasks sufficiently independent?"
-    },
-    llm=chat_model # Use the ChatPerplexity model for evaluation
-    )
+}
+
+_evaluator = None
+
+def get_evaluator():
+    """Loads the criteria evaluator on first use; it keeps no per-call state, so every evaluation shares it.
+
+    Only its prompt and output parser are used: the model is called through a_invoke_model, within the
+    same rate limits, circuit breakers, cache, metrics and budget as the planning calls."""
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = load_evaluator("criteria", criteria=CRITERIA, llm=chat_model)
+    return _evaluator
+
+async def a_evaluate_step(task: Dict, subtasks: List[Dict]) -> Dict[str, Any]:
+    """Evaluates one decomposition step: the subtasks a task was split into, without their own subtrees."""
+    evaluator = get_evaluator()
+    prediction = json.dumps([prompt_view(subtask) for subtask in subtasks], indent=2)
+    messages = [HumanMessage(content=evaluator.prompt.format(input=task['task_description'], output=prediction))]
+    response = await a_invoke_model(messages, "evaluation")
+    return evaluator.output_parser.parse(response.content)
+
+def is_sampled(task: Dict, sample_rate: float) -> bool:
+    """Samples by a hash of the task rather than at random, so a recorded run replays the same evaluations."""
+    if sample_rate >= 1:
+        return True
+    key = f"{task.get('task_id')}\n{task.get('task_description')}".encode()
+    return zlib.crc32(key) / 2**32 < sample_rate
+
+class DecompositionEvaluator:
+    """Scores the decomposition steps of one request in the background, as they are planned.
+
+    submit() only schedules the evaluation, so scoring never adds to planning or response time; call
+    drain() to wait for the scores, or read summary() at any time for the ones in so far."""
+
+    def __init__(self, sample_rate: float = EVALUATION_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.results: Dict[str, Dict[str, Any]] = {}  # task_id -> evaluator output
+        self.errors: Dict[str, str] = {}
+        self.skipped = 0
+        self._pending: Set[asyncio.Task] = set()
+
+    def submit(self, task: Dict, subtasks: List[Dict]):
+        if not subtasks:
+            return
+        if not is_sampled(task, self.sample_rate):
+            self.skipped += 1
+            return
+        # Snapshot the prompt fields now: planning keeps adding to these tasks while the evaluation waits
+        evaluation = asyncio.create_task(self._evaluate(prompt_view(task), [prompt_view(subtask) for subtask in subtasks]))
+        self._pending.add(evaluation)
+        evaluation.add_done_callback(self._pending.discard)
+
+    async def _evaluate(self, task: Dict, subtasks: List[Dict]):
+        try:
+            async with evaluation_semaphore():
+                self.results[task['task_id']] = await a_evaluate_step(task, subtasks)
+        except Exception as e:
+            print(f"Evaluation of {task.get('task_id')} failed: {e}")
+            self.errors[task['task_id']] = str(e)
+
+    async def drain(self):
+        """Waits for every submitted evaluation to finish."""
+        while self._pending:
+            await asyncio.gather(*list(self._pending))
 
-    evaluation = evaluator.evaluate_strings(
-        prediction=json.dumps(task, indent=2),
-        input=task['task_description']
-    )
+    def cancel(self):
+        for evaluation in list(self._pending):
+            evaluation.cancel()
 
-    return evaluation
\ No newline at end of file
+    def summary(self) -> Dict[str, Any]:
+        """Mean score over the evaluated steps, plus each step's result; steps still pending are not included yet."""
+        scores = [result["score"] for result in self.results.values() if isinstance(result.get("score"), (int, float))]
+        mean_score: Optional[float] = round(sum(scores) / len(scores), 3) if scores else None
+        return {
+            "evaluated": len(self.results),
+            "pending": len(self._pending),
+            "skipped": self.skipped,
+            "failed": len(self.errors),
+            "mean_score": mean_score,
+            "steps": dict(self.results),
+        }
@@ -0,0 +1,164 @@
+# fake_chat_model.py
+import asyncio
+import hashlib
+import json
+import random
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+class FakeProviderError(Exception):
+    """Transient provider failure (HTTP 503 or 429), retried by rate_limiter like a real one."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Fake provider error {status_code}")
+        self.status_code = status_code
+
+class FakeChatModel:
+    """Deterministic local stand-in for the chat models, for benchmarks and offline runs.
+
+    It recognises each prompt in llm_interaction.py and answers with a synthetic but valid reply: every task
+    is decomposed into `fanout` subtasks (chained by links if `link_chain`) until `decompose_depth`, below
+    which leaves use tool B. Latency is drawn from `latency` ('fixed', 'uniform' or 'lognormal' around
+    `latency_seconds`); `failure_rate` of calls raise a transient error and `parse_failure_rate` of replies
+    are malformed. Replies and draws are seeded from the prompt, so runs repeat regardless of scheduling.
+    astream delivers the same reply in chunks of `chunk_size` characters, the first after `first_chunk_share`
+    of the latency and the rest spread over the remainder."""
+
+    model_name = "fake"
+
+    def __init__(self, fanout: int = 3, decompose_depth: Optional[int] = None, link_chain: bool = True,
+                 latency: str = "fixed", latency_seconds: float = 0.05, failure_rate: float = 0.0,
+                 parse_failure_rate: float = 0.0, seed: int = 0, chunk_size: int = 16, first_chunk_share: float = 0.3):
+        self.fanout = fanout
+        self.decompose_depth = decompose_depth
+        self.link_chain = link_chain
+        self.latency = latency
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.parse_failure_rate = parse_failure_rate
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.first_chunk_share = first_chunk_share
+        self.calls = 0
+        self.calls_by_type: Dict[str, int] = {}
+        self.failures = 0
+        self.active = 0
+        self.peak_concurrency = 0
+        self._attempts: Dict[str, int] = {}
+
+    def _random(self, messages: List[BaseMessage]) -> random.Random:
+        """RNG seeded from the prompt and how often it has been sent, so retries can draw differently."""
+        digest = hashlib.sha256("\n".join(str(message.content) for message in messages).encode()).hexdigest()
+        attempt = self._attempts.get(digest, 0)
+        self._attempts[digest] = attempt + 1
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def _delay(self, rng: random.Random) -> float:
+        if self.latency == "uniform":
+            return rng.uniform(0, 2 * self.latency_seconds)
+        if self.latency == "lognormal":  # Heavy tail, median latency_seconds
+            return self.latency_seconds * rng.lognormvariate(0, 0.75)
+        return self.latency_seconds
+
+    @staticmethod
+    def call_type(messages: List[BaseMessage]) -> str:
+        system = str(messages[0].content) if len(messages) > 1 else ""
+        for marker, call_type in [("creating clear, concise JSON objects", "transform"), ("task decomposition", "decompose"),
+                                  ("numbered list of sibling subtask JSONs", "select_batch"), ("given a subtask JSON", "select"),
+                                  ("Python code generator", "codegen"), ("LLM prompt generator", "prompt_gen")]:
+            if marker in system:
+                return call_type
+        return "execute"
+
+    async def ainvoke(self, input: List[BaseMessage], config: Any = None, **kwargs: Any) -> BaseMessage:
+        content = []
+        async for chunk in self._reply(input, streamed=False):
+            content.append(chunk.content)
+        return AIMessage(content="".join(content))
+
+    async def astream(self, input: List[BaseMessage], config: Any = None, **kwargs: Any) -> AsyncIterator[BaseMessage]:
+        async for chunk in self._reply(input, streamed=True):
+            yield chunk
+
+    async def _reply(self, input: List[BaseMessage], streamed: bool) -> AsyncIterator[BaseMessage]:
+        rng = self._random(input)
+        call_type = self.call_type(input)
+        self.calls += 1
+        self.calls_by_type[call_type] = self.calls_by_type.get(call_type, 0) + 1
+        delay = self._delay(rng)
+        self.active += 1
+        self.peak_concurrency = max(self.peak_concurrency, self.active)
+        try:
+            await asyncio.sleep(delay * self.first_chunk_share if streamed else delay)
+            if rng.random() < self.failure_rate:
+                self.failures += 1
+                raise FakeProviderError(rng.choice([429, 503]))
+            if rng.random() < self.parse_failure_rate:
+                content = "Reasoning: I could not decide."
+            else:
+                content = getattr(self, f"_{call_type}")(str(input[-1].content), rng)
+            if not streamed:
+                yield AIMessageChunk(content=content)
+                return
+            chunks = [content[index:index + self.chunk_size] for index in range(0, len(content), self.chunk_size)]
+            for index, chunk in enumerate(chunks):
+                if index:
+                    await asyncio.sleep(delay * (1 - self.first_chunk_share) / (len(chunks) - 1))
+                yield AIMessageChunk(content=chunk)
+        finally:
+            self.active -= 1
+
+    def _should_decompose(self, content: str) -> bool:
+        depth = int(re.search(r"Current depth: (\d+)", content).group(1))
+        max_depth = int(re.search(r"Maximum depth: (\d+)", content).group(1))
+        return depth < (self.decompose_depth if self.decompose_depth is not None else max_depth - 1)
+
+    def _transform(self, content: str, rng: random.Random) -> str:
+        task = self._task("root", content.split("\n")[0][:80])
+        return f"Reasoning: Restating the prompt.\nAction: ```json\n{json.dumps(task)}\n```"
+
+    def _decompose(self, content: str, rng: random.Random) -> str:
+        parent = json.loads(content.split("Given the task JSON:\n", 1)[1].split("\n\nParent context:", 1)[0])
+        subtasks = []
+        for index in range(self.fanout):
+            task_id = f"{parent['task_id']}.{index + 1}"
+            ingests = [self._link(f"{parent['task_id']}.{index}")] if self.link_chain and index else []
+            produces = [self._link(task_id)] if self.link_chain else []
+            # A distinct token per task keeps siblings below the deduplication threshold
+            subtasks.append(self._task(task_id, f"Carry out stage_{task_id.replace('.', '_')} of the plan", ingests, produces))
+        return f"Reasoning: Splitting into {self.fanout} steps.\nAction: ```json\n{json.dumps(subtasks)}\n```"
+
+    def _select(self, content: str, rng: random.Random) -> str:
+        return f"Reasoning: Depth decides.\nAction: {'D' if self._should_decompose(content) else 'B'}"
+
+    def _select_batch(self, content: str, rng: random.Random) -> str:
+        count = int(re.search(r"Given the following (\d+) sibling", content).group(1))
+        tool = "D" if self._should_decompose(content) else "B"
+        selections = {str(index + 1): tool for index in range(count)}
+        return f"Reasoning: Depth decides.\nAction: ```json\n{json.dumps(selections)}\n```"
+
+    def _codegen(self, content: str, rng: random.Random) -> str:
+        return "import json\nprint(json.dumps({'final_code_output_json': inputs}))"
+
+    def _prompt_gen(self, content: str, rng: random.Random) -> str:
+        return f"Answer the task as JSON. Output JSON schema: {content.split('Output JSON schema: ', 1)[1]}"
+
+    def _execute(self, content: str, rng: random.Random) -> str:
+        match = re.search(r"Output JSON schema: (\{.*\})", content, re.DOTALL)
+        keys = json.loads(match.group(1)) if match else {}
+        return f"```json\n{json.dumps({key: f'fake {key}' for key in keys})}\n```"
+
+    @staticmethod
+    def _link(name: str) -> Dict:
+        return {"link_id": f"link-{name}", "link_name": f"output_{name}", "link_description": f"Output of {name}",
+                "data_type": "str", "data_source_type": "text"}
+
+    @staticmethod
+    def _task(task_id: str, description: str, ingests: List[Dict] = (), produces: List[Dict] = ()) -> Dict:
+        return {"task_id": task_id, "task_name": description, "task_description": description,
+                "ingests": list(ingests), "produces": list(produces), "subtasks": []}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "calls_by_type": dict(self.calls_by_type), "failures": self.failures,
+                "peak_concurrency": self.peak_concurrency}
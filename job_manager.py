@@ -0,0 +1,194 @@
+# job_manager.py
+import asyncio
+import concurrent.futures
+import copy
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+from config import JOB_QUEUE_SIZE, JOB_CONCURRENCY, JOB_RETENTION_SECONDS, VM_POOL_PREWARM, EVALUATION_ENABLED
+from schemas import Task
+from task_manager import TaskManager
+from orchestration import a_generate_task_tree
+from dag_executor import PipelinedExecutor
+from task_events import TaskEventLog
+from vm_pool import get_vm_pool, close_vm_pool
+from code_runner import close_code_worker_pool
+from metrics import metrics, current_request
+from planning_budget import PlanningBudget
+from evaluation import DecompositionEvaluator
+from task_execution import interactive
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the job queue is full."""
+
+class Job:
+    def __init__(self, prompt: str, reuse_decompositions: bool = True, budget: PlanningBudget = None):
+        self.job_id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.reuse_decompositions = reuse_decompositions
+        self.budget = budget  # Created at submission, so its deadline includes the time spent queued
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        self.task_manager = TaskManager()
+        self.root_task: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done: Optional[asyncio.Event] = None
+        self.events = TaskEventLog()
+        self.evaluator = DecompositionEvaluator() if EVALUATION_ENABLED else None  # Sampled scores, filled in after the job may have finished
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-ready view of the job; while running, the tree contains the nodes planned so far."""
+        root_task = self.root_task if self.root_task is not None else self.task_manager.root
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "task_count": self.task_manager.get_task_count(),
+            "tree": copy.deepcopy(root_task),
+            "metrics": metrics.request_summary(self.job_id),
+            "budget": self.budget.stats() if self.budget else None,
+            "evaluation": self.evaluator.summary() if self.evaluator else None,
+        }
+
+class JobManager:
+    """Runs task tree jobs on one long-lived event loop in a background thread.
+
+    Jobs wait in a bounded queue and at most `concurrency` of them run at once; submit() raises
+    QueueFullError when the queue is full so the HTTP layer can answer 429."""
+
+    def __init__(self, max_queued: int = JOB_QUEUE_SIZE, concurrency: int = JOB_CONCURRENCY,
+                 retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.max_queued = max_queued
+        self.concurrency = concurrency
+        self.retention_seconds = retention_seconds
+        self.jobs: Dict[str, Job] = {}
+        self.loop = asyncio.new_event_loop()
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread = threading.Thread(target=self._run_loop, name="job-manager", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_workers(), self.loop).result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _start_workers(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        for _ in range(self.concurrency):
+            self.loop.create_task(self._worker())
+        if VM_POOL_PREWARM:
+            get_vm_pool().start()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        job.events.emit("status", status=job.status)
+        request_token = current_request.set(job.job_id)  # Attributes this job's metrics to it
+        interactive_token = interactive.set(False)  # Nobody is at the server's terminal
+        try:
+            root_task, tasks_by_depth = await a_generate_task_tree(job.prompt, Task.model_json_schema(), job.task_manager, executor=PipelinedExecutor(events=job.events), events=job.events, reuse_decompositions=job.reuse_decompositions, budget=job.budget, evaluator=job.evaluator)
+            if root_task is None:
+                raise Exception("Task generation failed")
+            job.root_task = root_task
+            job.status = "succeeded"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            current_request.reset(request_token)
+            interactive.reset(interactive_token)
+            job.finished_at = time.time()
+            job.events.emit("status", status=job.status, error=job.error)
+            job.events.close()
+            job.done.set()
+
+    async def _enqueue(self, job: Job):
+        job.done = asyncio.Event()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+        self.jobs[job.job_id] = job
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at and now - job.finished_at > self.retention_seconds:
+                del self.jobs[job_id]
+
+    def submit(self, prompt: str, reuse_decompositions: bool = True, budget: PlanningBudget = None) -> Job:
+        """Queues a new job and returns it immediately."""
+        self.loop.call_soon_threadsafe(self._prune)
+        job = Job(prompt, reuse_decompositions, budget)
+        asyncio.run_coroutine_threadsafe(self._enqueue(job), self.loop).result()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a consistent snapshot of a job (taken on the loop thread), or None if unknown."""
+        async def snapshot():
+            job = self.jobs.get(job_id)
+            return job.snapshot() if job else None
+        return asyncio.run_coroutine_threadsafe(snapshot(), self.loop).result()
+
+    def events(self, job_id: str) -> Optional[TaskEventLog]:
+        """Returns the delta log of a job (looked up on the loop thread); the log is safe to read from any thread."""
+        async def lookup():
+            job = self.jobs.get(job_id)
+            return job.events if job else None
+        return asyncio.run_coroutine_threadsafe(lookup(), self.loop).result()
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Blocks until the job has finished and returns its snapshot.
+
+        Raises concurrent.futures.TimeoutError if it is still running after timeout seconds; the job keeps running."""
+        async def wait_done():
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            await job.done.wait()
+            return job.snapshot()
+        waiting = asyncio.run_coroutine_threadsafe(wait_done(), self.loop)
+        try:
+            return waiting.result(timeout)
+        except concurrent.futures.TimeoutError:
+            waiting.cancel()  # Do not leave the wait pending on the loop
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        async def count():
+            statuses: Dict[str, int] = {}
+            for job in self.jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {"queued": self._queue.qsize(), "max_queued": self.max_queued, "concurrency": self.concurrency, "jobs": statuses}
+        return asyncio.run_coroutine_threadsafe(count(), self.loop).result()
+
+    def close(self):
+        """Cancels the queued and running jobs, stops the loop's worker and VM pools, then the loop thread."""
+        if self.loop.is_closed():
+            return
+
+        async def shutdown():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await close_code_worker_pool()
+            await close_vm_pool()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
@@ -0,0 +1,146 @@
+# journal.py
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from config import JOURNAL_MODE, JOURNAL_PATH, JOURNAL_REPLAY_LATENCY
+
+class JournalMissError(Exception):
+    """Raised in replay mode for an interaction the journal has no (more) recordings of."""
+
+class ReplayedError(Exception):
+    """An error recorded during the original run, raised again at the same point of the replay."""
+
+    def __init__(self, message: str, error_type: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.status_code = status_code
+
+def interaction_key(kind: str, request: Any) -> str:
+    return hashlib.sha256(json.dumps([kind, request], sort_keys=True, default=str).encode()).hexdigest()
+
+class Journal:
+    """Records every external interaction of a run (model calls, code execution, VM steps) to a JSONL file,
+    or replays them from one.
+
+    Interactions are keyed by a hash of their kind and request; repeated identical requests are replayed in
+    recorded order. Replays wait for the recorded duration, or not at all with latency="zero", and never
+    fall back to live calls, so a replay is hermetic."""
+
+    def __init__(self, mode: str = JOURNAL_MODE, path: str = JOURNAL_PATH, latency: str = JOURNAL_REPLAY_LATENCY):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown journal mode: {mode}")
+        self.mode = mode
+        self.path = path
+        self.latency = latency
+        self.recorded: Dict[str, Deque[Dict]] = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+        if mode == "record":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "w")
+            self._write({"kind": "header", "recorded_at": time.time()})
+        elif mode == "replay":
+            with open(path) as file:
+                for line in file:
+                    entry = json.loads(line)
+                    if entry["kind"] != "header":
+                        self.recorded.setdefault(entry["key"], deque()).append(entry)
+            print(f"Replaying {sum(len(entries) for entries in self.recorded.values())} interactions from {path}")
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _write(self, entry: Dict):
+        with self._lock:
+            self._file.write(json.dumps(entry, default=str) + "\n")
+            self._file.flush()
+
+    def _record(self, kind: str, key: str, started: float, value: Any = None, error: Optional[BaseException] = None):
+        entry = {"kind": kind, "key": key, "offset": round(started - self.started, 6), "duration": round(time.monotonic() - started, 6)}
+        if error is None:
+            entry["value"] = value
+        else:
+            entry["error"] = {"message": str(error), "type": type(error).__name__, "status_code": getattr(error, "status_code", None)}
+        self._write(entry)
+
+    def _next(self, kind: str, key: str) -> Dict:
+        with self._lock:
+            entries = self.recorded.get(key)
+            if not entries:
+                raise JournalMissError(f"No recorded {kind} interaction left for key {key[:12]}")
+            return entries.popleft()
+
+    @staticmethod
+    def _replayed(entry: Dict) -> Any:
+        if "error" in entry:
+            error = entry["error"]
+            raise ReplayedError(error["message"], error["type"], error.get("status_code"))
+        return entry["value"]
+
+    async def call(self, kind: str, request: Any, live: Callable[[], Awaitable[Any]],
+                   encode: Callable[[Any], Any] = lambda value: value, decode: Callable[[Any], Any] = lambda value: value) -> Any:
+        """Runs an async interaction live (recording it in record mode) or replays its recording."""
+        if self.mode == "off":
+            return await live()
+        key = interaction_key(kind, request)
+        if self.replaying:
+            entry = self._next(kind, key)
+            if self.latency == "recorded":
+                await asyncio.sleep(entry["duration"])
+            return decode(self._replayed(entry))
+        started = time.monotonic()
+        try:
+            result = await live()
+        except Exception as e:
+            self._record(kind, key, started, error=e)
+            raise
+        self._record(kind, key, started, value=encode(result))
+        return result
+
+    def call_sync(self, kind: str, request: Any, live: Callable[[], Any],
+                  encode: Callable[[Any], Any] = lambda value: value, decode: Callable[[Any], Any] = lambda value: value) -> Any:
+        """Blocking counterpart of call(), for SDK calls made from worker threads."""
+        if self.mode == "off":
+            return live()
+        key = interaction_key(kind, request)
+        if self.replaying:
+            entry = self._next(kind, key)
+            if self.latency == "recorded":
+                time.sleep(entry["duration"])
+            return decode(self._replayed(entry))
+        started = time.monotonic()
+        try:
+            result = live()
+        except Exception as e:
+            self._record(kind, key, started, error=e)
+            raise
+        self._record(kind, key, started, value=encode(result))
+        return result
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remaining(self) -> Dict[str, int]:
+        """Recorded interactions a replay has not consumed, by kind; empty once the run replayed in full."""
+        left: Dict[str, int] = {}
+        for entries in self.recorded.values():
+            for entry in entries:
+                left[entry["kind"]] = left.get(entry["kind"], 0) + 1
+        return left
+
+journal = Journal()
@@ -0,0 +1,97 @@
+# json_stream.py
+from typing import List, Optional
+
+class JsonObjectStream:
+    """Incremental scanner that yields each top-level JSON object of a text as soon as its closing brace arrives.
+
+    Text is fed in arbitrary chunks (e.g. a model's token stream) and every character is scanned once, so a
+    whole reply costs O(n). Braces inside JSON strings are ignored; text outside objects (reasoning, code
+    fences, the brackets of an enclosing list) is skipped. With start_marker, scanning begins only after the
+    marker, e.g. "Action:" so braces in the reasoning are never mistaken for output."""
+
+    def __init__(self, start_marker: Optional[str] = None):
+        self.start_marker = start_marker
+        self.started = start_marker is None
+        self.pending = ""  # Text before the start marker, kept until the marker is complete
+        self.current: List[str] = []  # Chunks of the object being scanned
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """Scans chunk and returns the text of every object it completes."""
+        if not self.started:
+            self.pending += chunk
+            index = self.pending.find(self.start_marker)
+            if index < 0:
+                # Keep only what could still be the beginning of a marker split across chunks
+                self.pending = self.pending[-len(self.start_marker):]
+                return []
+            self.started = True
+            chunk, self.pending = self.pending[index + len(self.start_marker):], ""
+        objects = []
+        start = 0 if self.depth else None  # Where the current object starts within chunk
+        for index, char in enumerate(chunk):
+            if self.depth == 0:
+                if char == "{":
+                    self.depth, start = 1, index
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.current.append(chunk[start:index + 1])
+                    objects.append("".join(self.current))
+                    self.current, start = [], None
+        if self.depth:
+            self.current.append(chunk[start:])
+        return objects
+
+def extract_json_object(text: str) -> str:
+    """Returns the leftmost balanced {...} in text, or "" if there is none, normally in a single linear pass.
+
+    Linear-time replacement for the recursive pattern r'\\{(?:[^{}]|(?R))*\\}', which backtracks badly on
+    long or unbalanced replies. Unlike the pattern it ignores braces inside JSON strings. If the pass ends
+    inside a string, a brace in prose (e.g. 'note "a {" then {...}') may have pulled it into one, so the
+    scan is repeated from just after that brace."""
+    begin = 0
+    while True:
+        starts: List[int] = []  # Positions of the unclosed opening braces
+        best = None  # Leftmost closed object, in case an earlier brace never closes (e.g. a truncated reply)
+        in_string = escaped = False
+        for index in range(begin, len(text)):
+            char = text[index]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == "{":
+                starts.append(index)
+            elif not starts:
+                continue  # Quotes and closing braces in prose outside any object are not JSON
+            elif char == '"':
+                in_string = True
+            elif char == "}":
+                start = starts.pop()
+                if not starts:
+                    return text[start:index + 1]
+                if best is None or start < best[0]:
+                    best = (start, index + 1)
+        if best:
+            return text[best[0]:best[1]]
+        if not in_string:
+            return ""
+        begin = starts[0] + 1
@@ -0,0 +1,115 @@
+# link_registry.py
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from pydantic import ValidationError
+from schemas import Link
+from task_tree import LinkIndex
+
+class LinkRegistry:
+    """Shares one Link, and therefore one readiness event, per link_id across a task tree."""
+
+    def __init__(self):
+        self.links: Dict[str, Link] = {}
+        self.index = LinkIndex()  # Registered tasks by the links they produce and ingest
+        self.aliases: Dict[str, str] = {}  # link_id of a merged duplicate -> link_id of the canonical link
+        self.forwards: List[asyncio.Task] = []
+        self.closed = False
+
+    def resolve(self, link_id: str) -> str:
+        while link_id in self.aliases:
+            link_id = self.aliases[link_id]
+        return link_id
+
+    def get(self, link: Union[Dict, Link]) -> Link:
+        """Returns the shared Link for a link dict, creating it the first time its link_id is seen."""
+        link_id = self.resolve(link.link_id if isinstance(link, Link) else link["link_id"])
+        if link_id not in self.links:
+            if isinstance(link, Link):
+                self.links[link_id] = link
+            else:
+                try:
+                    self.links[link_id] = Link.model_validate(link)
+                except ValidationError:
+                    # LLM output does not always respect the enums; keep the data rather than drop the link
+                    self.links[link_id] = Link.model_construct(**link)
+        return self.links[link_id]
+
+    def register_task(self, task: Dict):
+        """Records the links an executable task ingests and produces."""
+        for link in task.get("ingests", []):
+            self.get(link)
+        for link in task.get("produces", []):
+            self.get(link)
+            producers = self.index.producers_of(link["link_id"])
+            if producers and producers[0] != task["task_id"]:
+                print(f"Link {link['link_id']} is produced by both {producers[0]} and {task['task_id']}")
+        self.index.add(task)
+
+    def merge_task(self, duplicate: Dict, canonical: Dict):
+        """Makes the links a merged duplicate task would produce aliases of the canonical task's links."""
+        for duplicate_link, canonical_link in matching_links(duplicate, canonical, self.resolve) or []:
+            target = self.get(canonical_link)
+            if duplicate_link["link_id"] == target.link_id:
+                continue
+            existing = self.links.get(duplicate_link["link_id"])
+            self.aliases[duplicate_link["link_id"]] = target.link_id
+            if existing is not None and existing is not target:
+                # Consumers may already be waiting on the duplicate's own link; forward the canonical value to them
+                self.forwards.append(asyncio.create_task(self._forward(target, existing)))
+
+    async def _forward(self, source: Link, destination: Link):
+        await source.wait_until_ready()
+        destination.set_value(source.value)
+
+    def close(self):
+        """Marks registration as finished and releases links that no task will ever produce."""
+        self.closed = True
+        for link_id, link in self.links.items():
+            if link_id not in self.aliases and not self.index.producers_of(link_id) and not link._ready_event.is_set():
+                print(f"Link {link_id} has no producer, using its current value: {link.value}")
+                link.set_value(link.value)
+
+    async def wait_for_inputs(self, task: Dict) -> Dict[str, Any]:
+        """Waits until every link the task ingests is ready and returns the inputs by link name."""
+        links = [self.get(link) for link in task.get("ingests", [])]
+        for link in links:
+            print("Waiting until ready:", link.link_name)
+        await asyncio.gather(*(link.wait_until_ready() for link in links))
+        return {link.link_name: link.value for link in links}
+
+    def release(self, link_id: str):
+        """Marks a link ready with its current value, e.g. to break a dependency cycle."""
+        link = self.links.get(self.resolve(link_id))
+        if link is not None and not link._ready_event.is_set():
+            print(f"Releasing link {link_id} with its current value: {link.value}")
+            link.set_value(link.value)
+
+    def resolve_produced(self, task: Dict):
+        """Releases the links of a finished task that it failed to set, so consumers do not wait forever."""
+        for link in task.get("produces", []):
+            shared_link = self.get(link)
+            if not shared_link._ready_event.is_set():
+                print(f"Task {task['task_id']} did not produce {shared_link.link_name}")
+                shared_link.set_value(None)
+
+    def write_back(self, tasks: List[Dict]):
+        """Copies the values of ready links into the link dicts of the given tasks."""
+        for task in tasks:
+            for link in task.get("ingests", []) + task.get("produces", []):
+                shared_link = self.links.get(self.resolve(link["link_id"]))
+                if shared_link is not None and shared_link._ready_event.is_set():
+                    link["value"] = shared_link.value
+
+def matching_links(duplicate: Dict, canonical: Dict, resolve: Callable[[str], str] = lambda link_id: link_id) -> Optional[List[Tuple[Dict, Dict]]]:
+    """Pairs every link a duplicate task produces with the canonical task's link of the same name.
+
+    Returns None when the canonical task cannot stand in for the duplicate: it must ingest exactly the same
+    links (after resolve maps merged links to their canonical ids) and produce every output of the duplicate.
+    Similar names and descriptions are not enough, a "format as table" step is only a duplicate if it formats
+    the same data."""
+    if {resolve(link["link_id"]) for link in duplicate.get("ingests", [])} != {resolve(link["link_id"]) for link in canonical.get("ingests", [])}:
+        return None
+    by_name = {link["link_name"]: link for link in canonical.get("produces", [])}
+    if not all(link["link_name"] in by_name for link in duplicate.get("produces", [])):
+        return None
+    return [(link, by_name[link["link_name"]]) for link in duplicate.get("produces", [])]
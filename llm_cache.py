@@ -0,0 +1,68 @@
+# llm_cache.py
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import RunnableConfig
+from cache_store import DiskCache
+
+# Model attributes that change the completion and therefore belong in the cache key
+CACHE_KEY_PARAMS = ["model", "model_name", "temperature", "top_p", "max_tokens", "seed", "model_kwargs"]
+
+class CachedChatModel:
+    """Wraps a chat model and serves repeated requests from a persistent response cache.
+
+    Cache reads and writes run in a worker thread, so SQLite never blocks the event loop."""
+
+    def __init__(self, model: Any, cache: Optional[DiskCache] = None):
+        self.model = model
+        self.cache = cache
+
+    def cache_key(self, messages: List[BaseMessage], **kwargs: Any) -> str:
+        """Content-addressed key over the model, its sampling parameters and the rendered messages."""
+        params = {name: getattr(self.model, name, None) for name in CACHE_KEY_PARAMS}
+        payload = {
+            "model_class": type(self.model).__name__,
+            "params": params,
+            "call_params": kwargs,
+            "messages": [[message.type, message.content] for message in messages],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def ainvoke(self, input: List[BaseMessage], config: Optional[RunnableConfig] = None, *, use_cache: bool = True, **kwargs: Any) -> BaseMessage:
+        """Returns the cached response when available; use_cache=False forces a fresh call and overwrites the entry."""
+        if self.cache is None:
+            return await self.model.ainvoke(input, config, **kwargs)
+        key = self.cache_key(input, **kwargs)
+        if use_cache:
+            content = await asyncio.to_thread(self.cache.get, key)
+            if content is not None:
+                return AIMessage(content=content, additional_kwargs={"cache_hit": True})
+        response = await self.model.ainvoke(input, config, **kwargs)
+        await asyncio.to_thread(self.cache.set, key, response.content)
+        return response
+
+    async def astream(self, input: List[BaseMessage], config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[BaseMessage]:
+        """Streams a fresh response chunk by chunk and caches the complete content once the stream ends."""
+        content = []
+        async for chunk in self.model.astream(input, config, **kwargs):
+            content.append(chunk.content)
+            yield chunk
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, self.cache_key(input, **kwargs), "".join(content))
+
+    async def lookup(self, messages: List[BaseMessage], **kwargs: Any) -> Optional[BaseMessage]:
+        """Returns the cached response for messages without calling the model, or None on a miss."""
+        if self.cache is None:
+            return None
+        content = await asyncio.to_thread(self.cache.get, self.cache_key(messages, **kwargs))
+        return None if content is None else AIMessage(content=content, additional_kwargs={"cache_hit": True})
+
+    async def invalidate(self, messages: List[BaseMessage], **kwargs: Any):
+        """Drops the cached response for messages, e.g. after it failed validation."""
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.delete, self.cache_key(messages, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
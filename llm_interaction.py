@@ -1,24 +1,109 @@
 # llm_interaction.py
 import re
 import json
-from typing import Dict, List
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage, SystemMessage
-from jsonschema import validate, ValidationError
-from config import chat_model, MAX_RETRIES, MAX_SUBTASKS, clean_json  # Import chat model
+import asyncio
+from typing import Callable, Dict, List
+from jsonschema import ValidationError
+from schema_validation import validate
+from langchain_core.messages import AIMessage, BaseMessage
+from config import MAX_RETRIES, MAX_SUBTASKS, SELECTION_FALLBACK_TOOL, TOOLS, clean_json
+from model_router import StreamInterruptedError, model_router
+from json_stream import JsonObjectStream
+from task_context import prompt_view
+from prompt_compiler import compile_prompt, schema_string
+from metrics import metrics
+from planning_budget import current_budget
+from journal import journal
 
-async def a_transform_prompt(prompt: str, schema: Dict, parent_context: str = "") -> Dict:
-    schema_string = json.dumps(schema)
-    system_message = SystemMessage(
-        content="You are an AI assistant specialized in creating clear, concise JSON objects following a schema.")
-    human_message = HumanMessage(
-        content=f"Convert the following prompt into a task: {prompt}\n\nFollowing the JSON schema: {schema_string}\n\nParent context: {parent_context}\n\nFirst, provide your reasoning for how you'll approach this task conversion. Then, output the JSON representation of the task. Set subtasks to [] (empty list)\n\nFormat your response as follows:\nReasoning: [Your reasoning here]\nAction: ```json[JSON representation of the task]```\n\nOnly output the reasoning and JSON representation of the task as described above.")
+TOOL_SELECTION_GUIDELINES = """**Part 1: Initial Assessment and Decomposition**
+
+1. **Task Complexity & Depth Limit:**
+   - Is this task inherently complex, requiring multiple steps or diverse information sources?
+   - Is the current depth less than the maximum allowed depth ({max_depth})?
+   - IF YES to both: Choose "D) Mix of Tools" and explain how to decompose.
+     (Decomposition Strategy: Aim to isolate components best suited for computer use agents, LLM reasoning, and deterministic code.)
+   - IF NO to either: Proceed to Part 2.
+
+**Part 2: Tool Selection for Non-Decomposed (or Leaf) Tasks**
+
+Now that we've assessed complexity, consider which single tool is best suited to DIRECTLY SOLVE the task (if it wasn't chosen to be decomposed). Select ONE of the following:
+
+   A) **Deterministic Code:** (Best for precise, rule-based operations; fast & reliable)
+      - Ideal for:
+         - Data transformation (e.g., cleaning, formatting, calculations)
+         - File manipulation (e.g., downloading, parsing, format conversion)
+         - Mathematical computations & logical operations
+         - API interactions where the API is well-defined and predictable.
+      - Examples: Sorting a list, converting a date format, calculating statistics, extracting data with regular expressions.
+      - NOT Suitable: Tasks requiring nuanced understanding of natural language, creative generation, or adapting to unpredictable environments.
+
+   B) **LLM Search & Reasoning:** (Best for knowledge-intensive tasks, nuanced text understanding, creative generation; adaptable but can be less precise)
+      - Ideal for:
+         - Information retrieval from the web when the answer isn't a simple fact but requires synthesizing information from multiple sources (e.g., "What are the current trends in AI research?")
+         - Complex text analysis (e.g., sentiment analysis, summarization, topic extraction)
+         - Creative content generation (e.g., writing blog posts, generating marketing copy)
+         - Answering questions requiring reasoning and inference (e.g., "What are the potential implications of this new technology?")
+      - Examples: Researching a topic, summarizing a document, translating text, writing a creative story.
+      - NOT Suitable: Tasks requiring precise calculations, structured data manipulation, or reliable interaction with specific applications.
+
+   C) **Computer Use Agent:** (Best for interactive tasks involving websites, applications with visual interfaces, or when direct manipulation is needed; can be slow & less reliable)
+      - Ideal for:
+         - Interacting with websites (e.g., filling out forms, clicking buttons, scraping data that requires dynamic interaction)
+         - Automating tasks within desktop applications
+         - Tasks requiring continuous visual feedback or responding to changes in a UI
+         - Situations where the information source is only accessible through interactive steps.
+      - Examples: Booking a flight, filling out an online application, monitoring a website for changes.
+      - NOT Suitable: Tasks that can be solved directly with information retrieval or deterministic code, or that don't involve interactive systems.
+      - Select this by default if the task is complex but we have exceeded the maximum depth.
+"""
+
+async def a_invoke_model(messages: List, call_type: str, use_cache: bool = True, on_chunk: Callable[[str], None] = None) -> BaseMessage:
+    """Sends messages to the model routed for call_type, within its provider's rate limits and concurrency cap,
+    and records token usage.
+
+    Cache hits are served before any rate budget is spent. use_cache=False bypasses the response cache,
+    e.g. when retrying after a bad reply. Latency, tokens and cost are recorded in metrics under call_type
+    and charged to the current planning budget, if any.
+    The call is journaled above the cache, so a replay needs neither the providers nor the cache.
+    With on_chunk, a live reply is streamed to it chunk by chunk; cached and replayed replies arrive as one chunk."""
+    streamed = False
+
+    def forward(chunk: str):
+        nonlocal streamed
+        streamed = True
+        on_chunk(chunk)
+
+    async def live() -> BaseMessage:
+        response = await model_router.lookup(messages, call_type) if use_cache else None
+        if response is None:
+            response = await model_router.ainvoke(messages, call_type, forward if on_chunk else None)
+        return response
 
-    chat_prompt = ChatPromptTemplate.from_messages([system_message, human_message])
+    with metrics.timer(call_type):
+        response = await journal.call("model", [call_type, [[message.type, message.content] for message in messages]],
+                                      live, encode=_encode_response, decode=_decode_response)
+    if on_chunk and not streamed:
+        on_chunk(response.content)
+    usage = metrics.record_call(call_type, messages, response)
+    budget = current_budget.get()
+    if budget:
+        budget.charge(usage["prompt_tokens"] + usage["completion_tokens"], usage["cost_usd"])
+    return response
+
+def _encode_response(response: BaseMessage) -> Dict:
+    return {"content": response.content, "additional_kwargs": response.additional_kwargs,
+            "response_metadata": getattr(response, "response_metadata", {}), "usage_metadata": getattr(response, "usage_metadata", None)}
+
+def _decode_response(value: Dict) -> BaseMessage:
+    return AIMessage(**{key: item for key, item in value.items() if item is not None})
+
+async def a_transform_prompt(prompt: str, schema: Dict, parent_context: str = "") -> Dict:
+    static_prefix = f"You are an AI assistant specialized in creating clear, concise JSON objects following a schema.\n\nConvert the prompt given by the user into a task following the JSON schema: {schema_string(schema)}\n\nFirst, provide your reasoning for how you'll approach this task conversion. Then, output the JSON representation of the task. Set subtasks to [] (empty list)\n\nFormat your response as follows:\nReasoning: [Your reasoning here]\nAction: ```json[JSON representation of the task]```\n\nOnly output the reasoning and JSON representation of the task as described above."
+    messages = compile_prompt(static_prefix, f"Convert the following prompt into a task: {prompt}\n\nParent context: {parent_context}")
 
     for attempt in range(MAX_RETRIES):
         try:
-            response = await chat_model.ainvoke(chat_prompt.format_messages())
+            response = await a_invoke_model(messages, "transform", use_cache=attempt == 0)
             response_content = response.content
             # print(response_content)
             reasoning, action = response_content.split("Action:", 1)
@@ -32,21 +117,28 @@ async def a_transform_prompt(prompt: str, schema: Dict, parent_context: str = ""
             return task
         except (ValidationError, json.JSONDecodeError, ValueError) as e:
             print(f"Attempt {attempt + 1} failed: {e}")
+            metrics.record_parse_failure("transform", retried=attempt < MAX_RETRIES - 1)
             if attempt == MAX_RETRIES - 1:
                 print(f"Error in task generation after {MAX_RETRIES} attempts.")
                 return None #Return None if error persists
 
-async def a_decompose_subtasks(task: Dict, schema: Dict, parent_context: str) -> List[Dict]:
-    schema_string = json.dumps(schema)
-    task_dict = json.dumps(task)
-    system_message = SystemMessage(content="You are an AI assistant specialized in task decomposition.")
-    human_message = HumanMessage(content=f"Given the task JSON:\n{task_dict}\nReturn a list of independent subtasks (maximum {MAX_SUBTASKS}). Avoid overly detailed steps; keep instructions general but actionable. Each subtask should be JSON formatted as follows:\n```json{schema_string}```\n\nParent context: {parent_context}\n\nFirst, provide your reasoning for how you'll approach breaking down this task. Then, output the list of subtasks in JSON format. Each subtask JSON should have 'subtasks' set to [] (empty list).\n\nFormat your response as follows:\nReasoning: [Your reasoning here]\nAction: ```json[JSON list of up to {MAX_SUBTASKS}subtasks]```\n\nOnly output the reasoning and JSON list of subtasks as described above.")
-    
-    chat_prompt = ChatPromptTemplate.from_messages([system_message, human_message])
-    
+async def a_decompose_subtasks(task: Dict, schema: Dict, parent_context: str, on_subtask: Callable[[Dict], None] = None, max_subtasks: int = MAX_SUBTASKS) -> List[Dict]:
+    """Asks the model for at most max_subtasks subtasks of task.
+
+    With on_subtask, the reply is streamed and each subtask is validated and handed to on_subtask as soon as
+    its JSON object closes; see a_stream_subtasks."""
+    task_dict = json.dumps(prompt_view(task))
+    static_prefix = f"You are an AI assistant specialized in task decomposition.\n\nGiven a task JSON, return a list of independent subtasks (maximum {max_subtasks}). Avoid overly detailed steps; keep instructions general but actionable. Each subtask should be JSON formatted as follows:\n```json{schema_string(schema)}```\n\nFirst, provide your reasoning for how you'll approach breaking down this task. Then, output the list of subtasks in JSON format. Each subtask JSON should have 'subtasks' set to [] (empty list).\n\nFormat your response as follows:\nReasoning: [Your reasoning here]\nAction: ```json[JSON list of up to {max_subtasks} subtasks]```\n\nOnly output the reasoning and JSON list of subtasks as described above."
+    messages = compile_prompt(static_prefix, f"Given the task JSON:\n{task_dict}\n\nParent context: {parent_context}")
+
     for attempt in range(MAX_RETRIES): #Add retry loop
         try:
-            response = await chat_model.ainvoke(chat_prompt.format_messages())
+            if on_subtask:
+                subtasks = await a_stream_subtasks(messages, schema, on_subtask, use_cache=attempt == 0, max_subtasks=max_subtasks)
+                if not subtasks:
+                    raise ValueError("No valid subtask in the streamed reply")
+                return subtasks
+            response = await a_invoke_model(messages, "decompose", use_cache=attempt == 0)
             response_content = response.content
             reasoning, action = response_content.split("Action:", 1)
             subtasks_json_string = action.strip()
@@ -56,69 +148,55 @@ async def a_decompose_subtasks(task: Dict, schema: Dict, parent_context: str) ->
             print(subtasks_json_string)
             subtasks = json.loads(subtasks_json_string)
             # TODO: handle this exception better
-            if len(subtasks) > MAX_SUBTASKS:
-                raise ValueError(f"More than {MAX_SUBTASKS} subtasks generated.")
-            for subtask in subtasks[:MAX_SUBTASKS]:  # Limit to MAX_SUBTASKS subtasks
+            if len(subtasks) > max_subtasks:
+                raise ValueError(f"More than {max_subtasks} subtasks generated.")
+            for subtask in subtasks[:max_subtasks]:  # Limit to max_subtasks subtasks
                 validate(instance=subtask, schema=schema)
-            return subtasks[:MAX_SUBTASKS]  # Return only the first MAX_SUBTASKS subtasks
+            return subtasks[:max_subtasks]  # Return only the first max_subtasks subtasks
         except (ValidationError, json.JSONDecodeError, ValueError) as e:
             print(f"Attempt {attempt + 1} failed: {e}")
+            metrics.record_parse_failure("decompose", retried=attempt < MAX_RETRIES - 1)
             if attempt == MAX_RETRIES - 1: #If max retries reached, print to log and return None
                 print(f"Error in subtask decomposition after {MAX_RETRIES} attempts.")
                 return None
 
-async def a_select_tool(subtask: Dict, schema: Dict, depth: int, max_depth: int) -> str:
-    schema_string = json.dumps(schema)
-    subtask_dict = json.dumps(subtask)
-    human_message = HumanMessage(content=f"""Given the subtask JSON:
-{subtask_dict}
-following the schema:
-{schema_string}
-
-Current depth: {depth}
-Maximum depth: {max_depth}
+async def a_stream_subtasks(messages: List, schema: Dict, on_subtask: Callable[[Dict], None], use_cache: bool = True, max_subtasks: int = MAX_SUBTASKS) -> List[Dict]:
+    """Streams a decomposition reply and hands out each valid subtask as soon as its object closes.
 
-**Part 1: Initial Assessment and Decomposition**
+    Subtasks that fail to parse or validate, and any beyond max_subtasks, are dropped on their own. Subtasks
+    already handed out cannot be taken back, so if the stream breaks off they are returned as they are."""
+    stream = JsonObjectStream(start_marker="Action:")  # Braces in the reasoning are not subtasks
+    subtasks = []
 
-1. **Task Complexity & Depth Limit:**
-   - Is this task inherently complex, requiring multiple steps or diverse information sources?
-   - Is the current depth less than the maximum allowed depth ({max_depth})?
-   - IF YES to both: Choose "D) Mix of Tools" and explain how to decompose.
-     (Decomposition Strategy: Aim to isolate components best suited for computer use agents, LLM reasoning, and deterministic code.)
-   - IF NO to either: Proceed to Part 2.
-
-**Part 2: Tool Selection for Non-Decomposed (or Leaf) Tasks**
+    def on_chunk(chunk: str):
+        for subtask_json_string in stream.feed(chunk):
+            if len(subtasks) >= max_subtasks:
+                print(f"Ignoring subtask beyond the first {max_subtasks}")
+                continue
+            try:
+                subtask = json.loads(subtask_json_string)
+                validate(instance=subtask, schema=schema)
+            except (ValidationError, json.JSONDecodeError) as e:
+                print(f"Dropping invalid subtask: {e}")
+                metrics.record_parse_failure("decompose")
+                continue
+            subtasks.append(subtask)
+            on_subtask(subtask)
 
-Now that we've assessed complexity, consider which single tool is best suited to DIRECTLY SOLVE the task (if it wasn't chosen to be decomposed). Select ONE of the following:
+    try:
+        await a_invoke_model(messages, "decompose", use_cache=use_cache, on_chunk=on_chunk)
+    except StreamInterruptedError as e:
+        if not subtasks:
+            raise ValueError(str(e))
+        print(f"{e}, keeping the {len(subtasks)} subtasks already received")
+    return subtasks
 
-   A) **Deterministic Code:** (Best for precise, rule-based operations; fast & reliable)
-      - Ideal for:
-         - Data transformation (e.g., cleaning, formatting, calculations)
-         - File manipulation (e.g., downloading, parsing, format conversion)
-         - Mathematical computations & logical operations
-         - API interactions where the API is well-defined and predictable.
-      - Examples: Sorting a list, converting a date format, calculating statistics, extracting data with regular expressions.
-      - NOT Suitable: Tasks requiring nuanced understanding of natural language, creative generation, or adapting to unpredictable environments.
+async def a_select_tool(subtask: Dict, schema: Dict, depth: int, max_depth: int) -> str:
+    subtask_dict = json.dumps(prompt_view(subtask))
+    static_prefix = f"""You will be given a subtask JSON following the schema:
+{schema_string(schema)}
 
-   B) **LLM Search & Reasoning:** (Best for knowledge-intensive tasks, nuanced text understanding, creative generation; adaptable but can be less precise)
-      - Ideal for:
-         - Information retrieval from the web when the answer isn't a simple fact but requires synthesizing information from multiple sources (e.g., "What are the current trends in AI research?")
-         - Complex text analysis (e.g., sentiment analysis, summarization, topic extraction)
-         - Creative content generation (e.g., writing blog posts, generating marketing copy)
-         - Answering questions requiring reasoning and inference (e.g., "What are the potential implications of this new technology?")
-      - Examples: Researching a topic, summarizing a document, translating text, writing a creative story.
-      - NOT Suitable: Tasks requiring precise calculations, structured data manipulation, or reliable interaction with specific applications.
-
-   C) **Computer Use Agent:** (Best for interactive tasks involving websites, applications with visual interfaces, or when direct manipulation is needed; can be slow & less reliable)
-      - Ideal for:
-         - Interacting with websites (e.g., filling out forms, clicking buttons, scraping data that requires dynamic interaction)
-         - Automating tasks within desktop applications
-         - Tasks requiring continuous visual feedback or responding to changes in a UI
-         - Situations where the information source is only accessible through interactive steps.
-      - Examples: Booking a flight, filling out an online application, monitoring a website for changes.
-      - NOT Suitable: Tasks that can be solved directly with information retrieval or deterministic code, or that don't involve interactive systems.
-      - Select this by default if the task is complex but we have exceeded the maximum depth.
-**Decision Process (Choose ONE of A, B, C, or D based on which best fits the task after considering the above guidelines).**
+{TOOL_SELECTION_GUIDELINES.format(max_depth=max_depth)}**Decision Process (Choose ONE of A, B, C, or D based on which best fits the task after considering the above guidelines).**
 
 Provide your reasoning for selecting the best approach, describing the pros and cons of each option. Then, output only the selected option letter.
 
@@ -127,47 +205,129 @@ Reasoning: [Your detailed reasoning here, explaining WHY you chose the selected
 Action: [Selected option letter]
 
 Only output the reasoning and selected option letter as described above."""
-    )
-        
-    chat_prompt = ChatPromptTemplate.from_messages([human_message])
-        
+    messages = compile_prompt(static_prefix, f"""Given the subtask JSON:
+{subtask_dict}
+
+Current depth: {depth}
+Maximum depth: {max_depth}""")
+
     for attempt in range(MAX_RETRIES): #Add retry loop
         try:
-            response = await chat_model.ainvoke(chat_prompt.format_messages())
+            response = await a_invoke_model(messages, "select", use_cache=attempt == 0)
             response_content = response.content
             reasoning, action = response_content.split("Action:", 1)
             selected_tool = action.strip()
             print(f"Subtask {subtask['task_id']} - Selected tool: {selected_tool}")
             print(f"Reasoning: {reasoning.strip()}")
             
-            if selected_tool in ['A', 'B', 'C', 'D']:
+            if selected_tool in TOOLS:
                 return selected_tool
             else:
                 print(f"Invalid tool selection for subtask {subtask['task_id']}")
+                metrics.record_parse_failure("select")
+                await model_router.invalidate(messages, "select")
                 return None
         except ValueError as e:
             print(f"Attempt {attempt + 1} failed: {e}")
+            metrics.record_parse_failure("select", retried=attempt < MAX_RETRIES - 1)
             if attempt == MAX_RETRIES - 1: #If max retries reached, print to log and return None
                 print(f"Error in selecting tool after {MAX_RETRIES} attempts.")
                 return None
 
 
+async def a_select_tool_or_fallback(subtask: Dict, schema: Dict, depth: int, max_depth: int) -> str:
+    """a_select_tool, but SELECTION_FALLBACK_TOOL when the call fails or yields no valid letter, so the subtask is kept."""
+    try:
+        selected_tool = await a_select_tool(subtask, schema, depth, max_depth)
+    except Exception as e:
+        print(f"Tool selection failed for subtask {subtask['task_id']}: {e}")
+        selected_tool = None
+    if not selected_tool:
+        print(f"Using tool {SELECTION_FALLBACK_TOOL} for subtask {subtask['task_id']}")
+        return SELECTION_FALLBACK_TOOL
+    return selected_tool
+
+async def a_select_tools(subtasks: List[Dict], schema: Dict, depth: int, max_depth: int) -> List[str]:
+    """Selects a tool for every sibling subtask in a single LLM call.
+
+    Subtasks whose selection is missing or invalid, or all of them if the batched call fails, fall back to
+    individual a_select_tool_or_fallback calls, so every subtask gets a tool."""
+    if len(subtasks) == 1:
+        return [await a_select_tool_or_fallback(subtasks[0], schema, depth, max_depth)]
+
+    subtasks_string = "\n".join(f"Subtask {index}: {json.dumps(prompt_view(subtask))}" for index, subtask in enumerate(subtasks, 1))
+    static_prefix = f"""You will be given a numbered list of sibling subtask JSONs, each following the schema:
+{schema_string(schema)}
+
+For EACH subtask independently, apply the following guidelines.
+
+{TOOL_SELECTION_GUIDELINES.format(max_depth=max_depth)}**Decision Process (Choose ONE of A, B, C, or D for each subtask based on which best fits it after considering the above guidelines).**
+
+Provide brief reasoning for each subtask. Then, output a JSON object mapping every subtask number to its selected option letter.
+
+Format your response as follows:
+Reasoning: [Your reasoning for each subtask here]
+Action: ```json{{"1": "[Selected option letter]", "2": "[Selected option letter]", ...}}```
+
+Only output the reasoning and JSON object as described above."""
+    messages = compile_prompt(static_prefix, f"""Given the following {len(subtasks)} sibling subtask JSONs:
+{subtasks_string}
+
+Current depth: {depth}
+Maximum depth: {max_depth}""")
+
+    selected_tools = [None] * len(subtasks)
+    try:
+        response = await a_invoke_model(messages, "select_batch")
+        reasoning, action = response.content.split("Action:", 1)
+        selections_json_string = clean_json(action.strip())
+        if selections_json_string == "":
+            raise ValueError(f"Badly formatted JSON string: {action.strip()}")
+        selections = json.loads(selections_json_string)
+        if not isinstance(selections, dict):
+            raise ValueError(f"Expected a JSON object of selections, got: {selections_json_string}")
+        print(reasoning.strip())
+        for index, subtask in enumerate(subtasks):
+            selected_tool = selections.get(str(index + 1))
+            if isinstance(selected_tool, str) and selected_tool.strip() in TOOLS:
+                selected_tools[index] = selected_tool.strip()
+                print(f"Subtask {subtask['task_id']} - Selected tool: {selected_tools[index]}")
+            else:
+                print(f"Invalid batched tool selection for subtask {subtask['task_id']}: {selected_tool}")
+                metrics.record_parse_failure("select_batch")
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"Batched tool selection failed: {e}")
+        metrics.record_parse_failure("select_batch")
+    except Exception as e:  # Open circuit, provider error or timeout: the siblings can still be selected one by one
+        print(f"Batched tool selection call failed: {e}")
+
+    # Fall back to one call per subtask for anything the batch did not resolve
+    missing = [index for index, selected_tool in enumerate(selected_tools) if selected_tool is None]
+    if missing:
+        await model_router.invalidate(messages, "select_batch")
+    fallbacks = await asyncio.gather(*(a_select_tool_or_fallback(subtasks[index], schema, depth, max_depth) for index in missing))
+    for index, selected_tool in zip(missing, fallbacks):
+        selected_tools[index] = selected_tool
+    return selected_tools
+
+
 async def a_generate_code(task_description: str, input_schema: Dict, output_schema: Dict) -> str: #New function
     """Generates Python code for a given task, considering input and output schemas."""
 
-    prompt = f"""You are a Python code generator. Generate a standalone Python function that performs the following task: {task_description}
+    static_prefix = """You are a Python code generator. Generate a standalone Python function that performs the task given by the user.
 
 The function should:
-- Take inputs according to the following JSON schema: {json.dumps(input_schema)}
-- Print to console an output named "final_code_output_json" that adheres to the following JSON schema: {json.dumps(output_schema)}
+- Take inputs according to the input JSON schema given by the user.
+- Print to console an output named "final_code_output_json" that adheres to the output JSON schema given by the user.
 - Be well-commented and easy to understand.
 - Import any libraries that it may need.
 - The function should only print "final_code_output_json", not anything else.
 
 Output ONLY the complete Python function code, including imports and function definition. Do not include any surrounding text or explanations."""
     try:
-        messages = [HumanMessage(content=prompt)]
-        response = await chat_model.ainvoke(messages)
+        messages = compile_prompt(static_prefix, f"Task: {task_description}\n\nInput JSON schema: {json.dumps(input_schema)}\n\nOutput JSON schema: {json.dumps(output_schema)}")
+        # Validated code is reused through artifact_cache, so always ask for fresh code here
+        response = await a_invoke_model(messages, "codegen", use_cache=False)
         code = response.content.strip()
         assert "final_code_output_json" in code
         return code
@@ -178,17 +338,17 @@ Output ONLY the complete Python function code, including imports and function de
 async def a_generate_llm_prompt(task_description: str, inputs: Dict, output_schema: Dict) -> str: #New function
     """Generates a prompt for a given task given its description, considering input and output schemas."""
 
-    prompt = f"""You are a LLM prompt generator. Generate a prompt that can be used for this task: {task_description}
+    static_prefix = """You are a LLM prompt generator. Generate a prompt that can be used for the task given by the user.
 
 The prompt should instruct the LLM to:
-- Take the following inputs: {json.dumps(inputs)}
-- Produce an output that adheres to the following JSON schema: {json.dumps(output_schema)}
+- Take the inputs given by the user.
+- Produce an output that adheres to the output JSON schema given by the user.
 - Consider the context and what will enable the best reasoning and most accurate search.
 
 Output ONLY the prompt. Do not include any surrounding text or explanations."""
     try:
-        messages = [HumanMessage(content=prompt)]
-        response = await chat_model.ainvoke(messages)
+        messages = compile_prompt(static_prefix, f"Task: {task_description}\n\nInputs: {json.dumps(inputs)}\n\nOutput JSON schema: {json.dumps(output_schema)}")
+        response = await a_invoke_model(messages, "prompt_gen")
         code = response.content.strip()
         return code
     except Exception as e:
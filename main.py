@@ -7,17 +7,23 @@ from langchain.schema import HumanMessage, SystemMessage
 from config import LANGCHAIN_TRACING_V2, chat_model
 from task_manager import TaskManager
 from orchestration import a_generate_task_tree
+from dag_executor import PipelinedExecutor
 from tree_utils import print_task_tree
-from evaluation import evaluate_task_decomposition
+from evaluation import DecompositionEvaluator
+from metrics import metrics
+from rate_limiter import rate_limiter_stats
+from model_router import model_router
+from decomposition_index import decomposition_index
+from code_runner import close_code_worker_pool
+from vm_pool import close_vm_pool
+from journal import journal
 from langchain_core.tracers.context import tracing_v2_enabled
 import json
-from typing import Dict
-from jsonschema import validate, ValidationError
 
 async def main():
     task_manager = TaskManager() #Creating task manager object here
     with tracing_v2_enabled(project_name="Task Decomposition") if LANGCHAIN_TRACING_V2 else open(os.devnull, "w") as f: # only trace if the relevant flag is turned on
-        prompt = input("Enter a prompt: ")
+        prompt = journal.call_sync("human_input", "prompt", lambda: input("Enter a prompt: "))
         # TODO: How can I transform the user prompt to be more specific and actionable for the LLM?
         # system_message = SystemMessage(
         #     content="You are a computer use agent capable of doing anything. Rephrase the user's task prompt to highlight the key action verbs in the user's request and identify what needs to be done.")
@@ -31,9 +37,12 @@ async def main():
         # print(f"{response_content=}")
         response_content = prompt
 
-        full_task, tasks_by_depth = await a_generate_task_tree(response_content, Task.model_json_schema(), task_manager) # Passing task_manager object
+        # Leaves run as soon as they are planned, wiring links between producers and consumers
+        # Every decomposition step is scored in the background while planning goes on
+        evaluator = DecompositionEvaluator(sample_rate=1.0)
+        full_task, tasks_by_depth = await a_generate_task_tree(response_content, Task.model_json_schema(), task_manager, executor=PipelinedExecutor(), evaluator=evaluator) # Passing task_manager object
 
-        if full_task and validate_task(full_task, Task.model_json_schema()):
+        if full_task and not task_manager.validation_errors: # Every task was validated as it was added
              # Print tasks by depth
             for depth in sorted(tasks_by_depth.keys()):
                 print(f"\nTasks at Depth {depth}:")
@@ -45,64 +54,28 @@ async def main():
             with open("out.txt", 'w') as file:
                 json.dump(full_task, file, indent=4)
 
-            evaluation = evaluate_task_decomposition(full_task)
+            await evaluator.drain()
             print("\nTask Decomposition Evaluation:")
-            print(json.dumps(evaluation, indent=2))
+            print(json.dumps(evaluator.summary(), indent=2))
         else:
+            evaluator.cancel()
             print("Task generation or validation failed.")
 
     print(f"\nTotal tasks generated: {task_manager.get_task_count()}")
-
-    # print("STARTING EXECUTION OF TASKS:..........................")
-    # futures = await traverse_task_tree(full_task)
-    
-    # async def wait_for_futures(futures_dict):
-    #     """Recursively wait for all futures in the tree"""
-    #     try:
-    #         # Wait for current task
-    #         await futures_dict['task_future']
-            
-    #         # Wait for all subtasks
-    #         for subtask_future in futures_dict['subtask_futures']:
-    #             await wait_for_futures(await subtask_future)
-    #     except Exception as e:
-    #         print(f"Error in task execution: {str(e)}")
-    
-    # # Start monitoring task completion in the background
-    # monitor_task = asyncio.create_task(wait_for_futures(futures))
-    
-    # # Your code can continue here without waiting for tasks to complete
-    # # The Link events will handle dependencies between tasks
-    
-    # # If you need to wait for everything at the very end:
-    # await monitor_task
-
-async def traverse_task_tree(task: Dict):
-    """Start execution of all tasks in the tree immediately.
-    Tasks will handle their own dependencies through Link events."""
-    
-    # Start current task execution without awaiting
-    task_future = asyncio.create_task(execute_task(task))
-    
-    # Start all subtasks immediately
-    subtask_futures = [
-        asyncio.create_task(traverse_task_tree(subtask))
-        for subtask in task.get('subtasks', [])
-    ]
-    
-    # Return all futures without waiting
-    return {
-        'task_future': task_future,
-        'subtask_futures': subtask_futures
-    }
-
-def validate_task(task: Dict, schema: Dict): #Keeping this function here since it is tiny
-    try:
-        validate(instance=task, schema=schema)
-        return True
-    except ValidationError as e:
-        print(f"Task validation error: {e}")
-        return False
+    print("\nMetrics by stage:")
+    print(json.dumps(metrics.summary(), indent=2))
+    print("\nRate limiting by provider:")
+    print(json.dumps(rate_limiter_stats(), indent=2))
+    print("\nModel routing:")
+    print(json.dumps(model_router.stats(), indent=2))
+    if decomposition_index:
+        print("\nDecomposition reuse:")
+        print(json.dumps(decomposition_index.stats(), indent=2))
+    if journal.replaying and journal.remaining():
+        print(f"\nRecorded interactions not replayed: {journal.remaining()}")
+    journal.close()
+    await close_code_worker_pool()
+    await close_vm_pool()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,159 @@
+# metrics.py
+import bisect
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from config import MODEL_PRICING, LATENCY_BUCKETS_SECONDS, METRICS_MAX_REQUESTS
+from prompt_compiler import estimate_tokens
+
+# Request (job) the current coroutine works for; asyncio tasks inherit it from the task that created them
+current_request: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_request", default=None)
+
+class Histogram:
+    """Fixed-bucket latency histogram (cumulative counts per upper bound, as in Prometheus)."""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS_SECONDS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return float("inf")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ["+Inf"], self.counts)},
+        }
+
+def _new_stage() -> Dict[str, Any]:
+    return {
+        "calls": 0, "cached_calls": 0, "estimated_calls": 0, "retries": 0, "parse_failures": 0, "errors": 0,
+        "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "latency": Histogram(),
+    }
+
+def _reported_usage(response: Any):
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    metadata = getattr(response, "response_metadata", None) or {}
+    reported = metadata.get("token_usage") or metadata.get("usage") or {}
+    return reported.get("prompt_tokens"), reported.get("completion_tokens")
+
+def call_cost(provider: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a call from MODEL_PRICING (per million tokens)."""
+    pricing = MODEL_PRICING.get(provider)
+    if not pricing:
+        return 0.0
+    return (prompt_tokens * pricing["prompt"] + completion_tokens * pricing["completion"]) / 1_000_000
+
+class Metrics:
+    """Counters and latency histograms per stage (LLM call type or execution tool), overall and per request."""
+
+    def __init__(self, max_requests: int = METRICS_MAX_REQUESTS):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.requests: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+        self.max_requests = max_requests
+        self._lock = threading.Lock()
+
+    def _stages_for(self, stage: str) -> List[Dict[str, Any]]:
+        """The global record for stage plus the current request's, creating them as needed (lock held)."""
+        records = [self.stages.setdefault(stage, _new_stage())]
+        request_id = current_request.get()
+        if request_id is not None:
+            if request_id not in self.requests:
+                self.requests[request_id] = {}
+                while len(self.requests) > self.max_requests:
+                    self.requests.popitem(last=False)
+            records.append(self.requests[request_id].setdefault(stage, _new_stage()))
+        return records
+
+    def _add(self, stage: str, **counts: float):
+        with self._lock:
+            for record in self._stages_for(stage):
+                for key, value in counts.items():
+                    record[key] += value
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            for record in self._stages_for(stage):
+                record["latency"].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Records the wall time of the block, and an error if it raises."""
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self._add(stage, errors=1)
+            raise
+        finally:
+            self.observe(stage, time.monotonic() - started)
+
+    def record_call(self, call_type: str, messages: List, response: Any) -> Dict[str, float]:
+        """Adds the tokens and estimated cost of an LLM call and returns them."""
+        if getattr(response, "additional_kwargs", {}).get("cache_hit"):
+            self._add(call_type, calls=1, cached_calls=1)
+            return {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        prompt_tokens, completion_tokens = _reported_usage(response)
+        estimated = prompt_tokens is None or completion_tokens is None
+        if estimated:
+            prompt_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+            completion_tokens = estimate_tokens(str(response.content))
+        provider = getattr(response, "additional_kwargs", {}).get("provider")
+        cost_usd = call_cost(provider, prompt_tokens, completion_tokens)
+        self._add(call_type, calls=1, estimated_calls=int(estimated), prompt_tokens=prompt_tokens,
+                  completion_tokens=completion_tokens, cost_usd=cost_usd)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost_usd": cost_usd}
+
+    def record_retry(self, stage: str):
+        self._add(stage, retries=1)
+
+    def record_parse_failure(self, stage: str, retried: bool = False):
+        """Counts a reply that could not be parsed or validated, and the retry it triggers if any."""
+        self._add(stage, parse_failures=1, retries=int(retried))
+
+    @staticmethod
+    def _summarize(stages: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        summary = {}
+        total = {key: 0 for key in _new_stage() if key != "latency"}
+        for stage, record in stages.items():
+            summary[stage] = {key: (value.summary() if key == "latency" else value) for key, value in record.items()}
+            for key in total:
+                total[key] += record[key]
+        total["cost_usd"] = round(total["cost_usd"], 6)
+        summary["total"] = total
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        """Every stage's counters and latency percentiles, plus an overall 'total' entry."""
+        with self._lock:
+            return self._summarize(self.stages)
+
+    def request_summary(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            stages = self.requests.get(request_id)
+            return self._summarize(stages) if stages is not None else None
+
+metrics = Metrics()
@@ -0,0 +1,129 @@
+# model_router.py
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+from langchain_core.messages import BaseMessage
+from config import chat_models, CALL_PRIORITIES, MODEL_ROUTES, HEDGE_ENABLED, HEDGE_PROVIDERS, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_DEFAULT_DELAY_SECONDS, HEDGE_LATENCY_WINDOW
+from concurrency import provider_semaphore
+from prompt_compiler import estimate_tokens
+from rate_limiter import a_call_with_limits, get_limiter
+from metrics import metrics
+
+class StreamInterruptedError(Exception):
+    """A streamed call failed after part of its reply was already handed out; it is not retried."""
+
+async def a_stream(model: Any, messages: List[BaseMessage], on_chunk: Callable[[str], None]) -> BaseMessage:
+    """Streams a reply, passing each chunk's text to on_chunk, and returns the assembled message."""
+    response = None
+    try:
+        async for chunk in model.astream(messages):
+            response = chunk if response is None else response + chunk
+            on_chunk(chunk.content)
+    except Exception as e:
+        if response is None:
+            raise  # Nothing was handed out yet, so the call can still be retried
+        raise StreamInterruptedError(f"Stream interrupted after partial output ({type(e).__name__})") from e
+    return response
+
+class ModelRouter:
+    """Routes each call type to a provider's chat model and optionally hedges slow calls to a second provider."""
+
+    def __init__(self, models: Dict, routes: Dict[str, str] = MODEL_ROUTES, hedge_enabled: bool = HEDGE_ENABLED, hedge_providers: Dict[str, str] = HEDGE_PROVIDERS):
+        unknown = {provider for provider in routes.values() if provider not in models}
+        if unknown:
+            raise ValueError(f"MODEL_ROUTES names unknown providers: {', '.join(sorted(unknown))}")
+        self.models = models
+        self.routes = routes
+        self.hedge_enabled = hedge_enabled
+        self.hedge_providers = hedge_providers
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def providers(self, call_type: str) -> List[str]:
+        """The routed provider for call_type, followed by its hedge provider when hedging is enabled."""
+        provider = self.routes.get(call_type, self.routes["default"])
+        hedge = self.hedge_providers.get(provider) if self.hedge_enabled else None
+        return [provider, hedge] if hedge in self.models and hedge != provider else [provider]
+
+    async def lookup(self, messages: List[BaseMessage], call_type: str) -> Optional[BaseMessage]:
+        """Returns a cached response from any provider this call type may be answered by."""
+        for provider in self.providers(call_type):
+            response = await self.models[provider].lookup(messages)
+            if response is not None:
+                return response
+        return None
+
+    async def invalidate(self, messages: List[BaseMessage], call_type: str):
+        for provider in self.providers(call_type):
+            await self.models[provider].invalidate(messages)
+
+    def hedge_delay(self, provider: str) -> float:
+        """The HEDGE_PERCENTILE latency of recent calls to provider, once there are enough samples."""
+        samples = sorted(self.latencies.get(provider, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))]
+
+    async def _call(self, provider: str, messages: List[BaseMessage], call_type: str, on_chunk: Callable[[str], None] = None) -> BaseMessage:
+        async def call() -> BaseMessage:
+            async with provider_semaphore(provider).slot(CALL_PRIORITIES.get(call_type, 0.0)):
+                if on_chunk:
+                    return await a_stream(self.models[provider], messages, on_chunk)
+                return await self.models[provider].ainvoke(messages, use_cache=False)
+
+        started = time.monotonic()
+        estimated_tokens = sum(estimate_tokens(message.content) for message in messages)
+        response = await a_call_with_limits(provider, call, estimated_tokens, on_retry=lambda: metrics.record_retry(call_type))
+        response.additional_kwargs["provider"] = provider  # Lets metrics price the call
+        self.latencies.setdefault(provider, deque(maxlen=HEDGE_LATENCY_WINDOW)).append(time.monotonic() - started)
+        # Charge the completion (and any estimation error) to the provider's token budget
+        get_limiter(provider).tokens.adjust(estimate_tokens(response.content))
+        return response
+
+    async def ainvoke(self, messages: List[BaseMessage], call_type: str, on_chunk: Callable[[str], None] = None) -> BaseMessage:
+        """Calls the routed model; if it has not answered within its hedge delay, races a backup provider.
+
+        With on_chunk, the reply is streamed to it as it arrives; streamed calls are never hedged, since
+        two racing streams cannot feed one consumer."""
+        providers = self.providers(call_type)
+        if on_chunk:
+            return await self._call(providers[0], messages, call_type, on_chunk)
+        primary = asyncio.create_task(self._call(providers[0], messages, call_type))
+        if len(providers) == 1:
+            return await primary
+
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay(providers[0]))
+            if primary in done and primary.exception() is None:
+                return primary.result()
+            print(f"Hedging {call_type} call from {providers[0]} to {providers[1]}")
+            self.hedges_fired += 1
+            tasks.append(asyncio.create_task(self._call(providers[1], messages, call_type)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the slower call, or both if the caller itself was cancelled
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "routes": self.routes,
+            "hedging": self.hedge_enabled,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedge_delays": {provider: round(self.hedge_delay(provider), 3) for provider in self.latencies},
+        }
+
+model_router = ModelRouter(chat_models)
@@ -1,10 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import asyncio #Import asyncio
+import concurrent.futures
+import json
 import logging
-from schemas import Task  # Import Task
-from task_manager import TaskManager  # Import TaskManager
-from orchestration import a_generate_task_tree  # Import a_generate_task_tree
+import threading
+from config import SYNC_GENERATE_TIMEOUT_SECONDS
+from job_manager import JobManager, QueueFullError
+from metrics import metrics
+from planning_budget import PlanningBudget
+from rate_limiter import rate_limiter_stats
+
+SSE_KEEPALIVE_SECONDS = 15
 
 # Configure logging (optional but recommended)
 logging.basicConfig(level=logging.DEBUG)
@@ -20,13 +26,33 @@ cors = CORS(
         r"/*": {  # Apply to all routes
             "origins": ["http://localhost:3000"],  # Your React app's origin (DEVELOPMENT)
             "methods": ["GET", "POST", "OPTIONS"],  # Allowed HTTP methods
-            "allow_headers": ["Content-Type"],  # Allowed headers in requests
+            "allow_headers": ["Content-Type", "Last-Event-ID"],  # Allowed headers in requests
             "supports_credentials": True,  # Allow sending cookies/credentials
         }
     },
     supports_credentials=True,  # Enable CORS for the entire app
 )
 
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """Creates the shared job manager (and its event loop thread) on first use."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+    return _job_manager
+
+def budget_from(body: dict) -> PlanningBudget:
+    """The planning budget requested by deadline_seconds, max_tokens and max_cost_usd, or None if unbounded.
+
+    Raises ValueError for limits that are not positive numbers."""
+    limits = {key: body.get(key) for key in ("deadline_seconds", "max_tokens", "max_cost_usd")}
+    if all(limit is None for limit in limits.values()):
+        return None
+    return PlanningBudget(**limits)
+
 # New Flask route to handle task tree generation
 @app.route("/api/generate_task_tree", methods=["POST"])
 def generate_task_tree_route():
@@ -35,27 +61,100 @@ def generate_task_tree_route():
         if not prompt:
             return jsonify({"error": "Prompt is required"}), 400
 
-        # --- Your task tree generation logic here ---
-        # Call a_generate_task_tree and return the root_task
-        task_manager = TaskManager()
-
-        async def generate(): # Define an async function to run the async task
-            root_task, tasks_by_depth = await a_generate_task_tree(prompt, Task.model_json_schema(), task_manager)
-            return root_task
+        # Runs on the shared event loop and waits for the result; prefer /api/jobs for long trees.
+        # After SYNC_GENERATE_TIMEOUT_SECONDS the job keeps running and its id is returned with 202.
+        job_manager = get_job_manager()
+        reuse_decompositions = request.json.get("reuse_decompositions", True)  # False plans from scratch
+        try:
+            budget = budget_from(request.json)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        job_id = job_manager.submit(prompt, reuse_decompositions, budget).job_id
+        try:
+            job = job_manager.wait(job_id, timeout=SYNC_GENERATE_TIMEOUT_SECONDS)
+        except concurrent.futures.TimeoutError:
+            return jsonify({"job_id": job_id, "status": job_manager.get(job_id)["status"]}), 202, {"Location": f"/api/jobs/{job_id}"}
 
-        loop = asyncio.new_event_loop() #Create a new event loop
-        asyncio.set_event_loop(loop) #Set the loop as the current loop
-        root_task = loop.run_until_complete(generate()) # Run the async function until it is complete
-
-        if root_task:
-            return jsonify(root_task)  # Serialize and return root_task as JSON
+        if job["status"] == "succeeded":
+            return jsonify(job["tree"])  # Serialize and return root_task as JSON
         else:
-            return jsonify({"error": "Task generation failed"}), 500
+            return jsonify({"error": job["error"] or "Task generation failed"}), 500
 
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         logger.exception("Error generating task tree")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/jobs", methods=["POST"])
+def submit_job_route():
+    """Queues a task tree generation job and returns its id without waiting."""
+    body = request.get_json(silent=True) or {}
+    prompt = body.get("prompt")
+    if not prompt:
+        return jsonify({"error": "Prompt is required"}), 400
+    try:
+        budget = budget_from(body)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        job = get_job_manager().submit(prompt, body.get("reuse_decompositions", True), budget)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "5"}
+    return jsonify({"job_id": job.job_id, "status": job.status}), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job_route(job_id):
+    """Returns the status of a job and its tree: partial while running, final once succeeded."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events_route(job_id):
+    """Streams the job's tree deltas as Server-Sent Events.
+
+    Each event carries its sequence number as the SSE id, so a client reconnecting with Last-Event-ID
+    (or ?since=<seq>) only receives the deltas it missed. The stream ends after the final status event."""
+    events = get_job_manager().events(job_id)
+    if events is None:
+        return jsonify({"error": "Unknown job"}), 404
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.args.get("since", 0))
+    except ValueError:
+        return jsonify({"error": "Invalid sequence number"}), 400
+    if since < 0:
+        return jsonify({"error": "Invalid sequence number"}), 400
+
+    def stream(seq):
+        yield "retry: 2000\n\n"
+        while True:
+            new_events = events.since(seq, timeout=SSE_KEEPALIVE_SECONDS)
+            for event in new_events:
+                seq = event["seq"]
+                yield f"id: {seq}\nevent: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'), default=str)}\n\n"
+            if not new_events:
+                if events.closed:
+                    return
+                yield ": keepalive\n\n"  # Keeps proxies from closing an idle stream
+
+    return Response(stream(since), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    """Latency, retry, parse failure, token and cost metrics per stage; ?request_id=<job id> narrows them to one job."""
+    request_id = request.args.get("request_id")
+    if request_id:
+        summary = metrics.request_summary(request_id)
+        if summary is None:
+            return jsonify({"error": "Unknown request"}), 404
+        return jsonify(summary)
+    return jsonify({
+        "stages": metrics.summary(),
+        "rate_limits": rate_limiter_stats(),
+        "jobs": _job_manager.stats() if _job_manager else None,
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -1,56 +1,267 @@
-from typing import Dict, List
-from config import MAX_TASKS, MAX_DEPTH
+import asyncio
+from typing import Dict, List, Tuple
+from config import MAX_TASKS, MAX_DEPTH, MAX_SUBTASKS, SUBTASK_DEDUP_ENABLED, STREAM_DECOMPOSITION, BUDGET_LEAF_TOOL
 from task_manager import TaskManager
-from llm_interaction import a_transform_prompt, a_decompose_subtasks, a_select_tool
-from task_execution import execute_task
-
-async def a_generate_task_tree(prompt: str, schema: Dict, task_manager: TaskManager, max_depth: int = MAX_DEPTH):
-    # print(f"{prompt=}, {schema=}")
-    # print(f"{schema['$defs']['Task'].keys()=}")
-    # TODO: clean up
-    task = await a_transform_prompt(prompt, schema, "")
-    task["ingests"] = []
+from llm_interaction import a_transform_prompt, a_decompose_subtasks, a_select_tool, a_select_tools
+from dag_executor import PipelinedExecutor, is_executable
+from task_events import TaskEventLog
+from similarity_index import SimilarityIndex
+from link_registry import matching_links
+from decomposition_index import decomposition_index
+from journal import journal
+from task_context import ParentContext
+from planning_budget import PlanningBudget, current_budget
+from evaluation import DecompositionEvaluator
+from metrics import metrics
+
+class SiblingToolSelector:
+    """Selects tools for siblings that arrive one by one from a streamed decomposition.
+
+    The first sibling is selected alone as soon as it arrives, so its branch starts before the reply ends;
+    the others are selected together in one batched call once the reply is complete. A decomposition thus
+    costs at most two selection calls instead of one, and the calls depend only on the reply, never on
+    timing, so journal replays (journal.py) stay exact."""
+
+    def __init__(self, schema: Dict, depth: int, max_depth: int):
+        self.schema = schema
+        self.depth = depth
+        self.max_depth = max_depth
+        self.group: List[Tuple[Dict, asyncio.Future]] = []
+        self.calls: List[asyncio.Task] = []
+
+    def add(self, subtask: Dict) -> asyncio.Future:
+        """Queues subtask and returns a future for its selected tool."""
+        future = asyncio.get_running_loop().create_future()
+        self.group.append((subtask, future))
+        if not self.calls:  # The first sibling
+            self.flush()
+        return future
+
+    def flush(self):
+        """Starts the selection call for the queued siblings, e.g. once the reply has ended."""
+        if self.group:
+            self.calls.append(asyncio.create_task(self._select(self.group)))
+            self.group = []
+
+    async def _select(self, group: List[Tuple[Dict, asyncio.Future]]):
+        try:
+            selected_tools = await a_select_tools([subtask for subtask, _ in group], self.schema, self.depth, self.max_depth)
+        except asyncio.CancelledError:
+            for _, waiting in group:
+                waiting.cancel()
+            raise
+        except Exception as e:
+            for _, waiting in group:
+                if not waiting.done():
+                    waiting.set_exception(e)
+            return
+        for (_, waiting), selected_tool in zip(group, selected_tools):
+            if not waiting.done():  # Its expansion may have been cancelled meanwhile
+                waiting.set_result(selected_tool)
+
+    def cancel(self):
+        for call in self.calls:
+            call.cancel()
+        for _, waiting in self.group:
+            waiting.cancel()
+
+async def a_generate_task_tree(prompt: str, schema: Dict, task_manager: TaskManager, max_depth: int = MAX_DEPTH, executor: PipelinedExecutor = None, events: TaskEventLog = None, reuse_decompositions: bool = True, budget: PlanningBudget = None, evaluator: DecompositionEvaluator = None,
+                               max_subtasks: int = MAX_SUBTASKS, stream: bool = STREAM_DECOMPOSITION):
+    """Builds the task tree, expanding every ready node concurrently within the provider limits.
+
+    With an executor, leaves start running as soon as they are planned and the tree is returned once
+    both planning and execution have drained. Without one, leaves are only planned; run them with
+    dag_executor.execute_task_tree. With an event log, every node is also emitted as a delta as soon as it is added.
+
+    Subtasks that near-duplicate an already planned task (see similarity_index.py) are merged into it:
+    they stay in the tree with duplicate_of set, but are neither expanded nor executed, and their
+    produced links alias the canonical task's links.
+
+    Each decomposition has at most max_subtasks subtasks.
+
+    With stream (STREAM_DECOMPOSITION by default), the decomposition reply is streamed and each subtask starts its tool selection
+    and expansion as soon as it arrives, instead of once the whole reply is in (see SiblingToolSelector).
+
+    Decomposition prompts carry a bounded summary of the task's ancestors (see task_context.py), not the
+    whole chain of parent descriptions.
+
+    Decompositions are looked up in the persistent decomposition index before asking the LLM, and the
+    ones planned here are added to it once planning succeeds; reuse_decompositions=False skips both, as
+    does an active journal (a recorded run must not depend on the index's state).
+
+    With a budget, a node is planned as a BUDGET_LEAF_TOOL leaf instead of being decomposed once too little
+    of the budget is left for its depth (see PlanningBudget.allows_decomposition), and planning stops at the
+    deadline: nodes still waiting for their decomposition become leaves and the tree planned so far is returned.
+    The budget is the current_budget while the tree is built, so every model call it makes is charged to it;
+    leaves still running at the deadline are cancelled.
+
+    With an evaluator, every decomposition the LLM makes is handed to it as soon as it is complete; the
+    evaluations run in the background and are not waited for here (see evaluation.DecompositionEvaluator)."""
+    budget_token = current_budget.set(budget) if budget else None
+    try:
+        return await _a_generate_task_tree(prompt, schema, task_manager, max_depth, executor, events, reuse_decompositions, budget, evaluator, max_subtasks, stream)
+    finally:
+        if budget_token:
+            current_budget.reset(budget_token)
+
+async def _a_generate_task_tree(prompt: str, schema: Dict, task_manager: TaskManager, max_depth: int, executor: PipelinedExecutor, events: TaskEventLog,
+                                reuse_decompositions: bool, budget: PlanningBudget, evaluator: DecompositionEvaluator, max_subtasks: int, stream: bool):
+    try:
+        task = await asyncio.wait_for(a_transform_prompt(prompt, schema, ""), budget.seconds_left() if budget else None)
+    except asyncio.TimeoutError:
+        raise Exception("Deadline passed before the prompt could be turned into a task")
     if not task:
         raise Exception("Failed to generate task from user prompt")
-    task_queue = [(task, 0, None, "")]
-    root_task = None
-    tasks_by_depth = {}
+    task["ingests"] = []
+    tree = task_manager.tree
+    context = ParentContext(tree)  # Bounded ancestor summaries for decomposition prompts
+    similarity_index = SimilarityIndex() if SUBTASK_DEDUP_ENABLED else None
+    index = decomposition_index if reuse_decompositions and not journal.active else None
+    decomposed: List[Tuple[Dict, List[Dict]]] = []  # LLM decompositions made in this run, indexed once planning succeeds
 
-    while task_queue:
-        current_task, current_depth, parent_task, parent_context = task_queue.pop(0)
+    def merge_duplicate(current_task: Dict, current_depth: int, parent_task: Dict) -> bool:
+        """Attaches current_task as a duplicate of an already planned task, if there is one it can be merged into."""
+        # Ancestors are excluded: merging a task into one of its ancestors would make it depend on itself
+        excluded = [parent_task] + tree.ancestors(parent_task) if parent_task else []
+        canonical = similarity_index.find_duplicate(
+            current_task, exclude=excluded,
+            accept=lambda candidate: matching_links(current_task, candidate, similarity_index.resolve) is not None)
+        if canonical is None:
+            return False
+        similarity_index.record_merge(matching_links(current_task, canonical, similarity_index.resolve))
+        current_task['duplicate_of'] = canonical['task_id']
+        current_task['selected_tool'] = canonical['selected_tool']
+        current_task['depth'] = current_depth
+        task_manager.add_task(current_task, parent_task, counted=False)
+        if events:
+            events.node_added(current_task, parent_task)
+            events.tool_selected(current_task)
+        if executor:
+            executor.merge(current_task, canonical)
+        return True
 
+    async def expand(current_task: Dict, current_depth: int, parent_task: Dict, selected_tool: str = None) -> bool:
+        """Selects a tool for a node (unless already selected), attaches it to its parent and decomposes it if needed."""
         if task_manager.get_task_count() >= task_manager.max_tasks:
-            break
+            return False
+        if similarity_index and merge_duplicate(current_task, current_depth, parent_task):
+            return True
 
-        selected_tool = await a_select_tool(current_task, schema, current_depth, max_depth)
+        if selected_tool is None:
+            selected_tool = await a_select_tool(current_task, schema, current_depth, max_depth)
         if not selected_tool:
-            continue
+            return False
+        if selected_tool == 'D' and budget and not budget.allows_decomposition(current_task, parent_task, current_depth, max_depth):
+            print(f"Budget low, planning {current_task.get('task_id')} as a leaf")
+            budget.leaf_fallbacks += 1
+            selected_tool = BUDGET_LEAF_TOOL
 
         current_task['selected_tool'] = selected_tool
         current_task['depth'] = current_depth
 
-        if not task_manager.add_task(current_task):
-            break
+        if not task_manager.add_task(current_task, parent_task):
+            return False
 
-        if root_task is None:
-            root_task = current_task
+        if similarity_index:
+            similarity_index.add(current_task)
 
-        if parent_task:
-            if 'subtasks' not in parent_task:
-                parent_task['subtasks'] = []
-            parent_task['subtasks'].append(current_task)
+        if events:
+            events.node_added(current_task, parent_task)
+            events.tool_selected(current_task)
 
-        if current_depth not in tasks_by_depth:
-            tasks_by_depth[current_depth] = []
-        tasks_by_depth[current_depth].append(current_task)
         print(current_task)
+        if executor and is_executable(current_task):
+            executor.submit(current_task)
         if selected_tool == 'D':  # Only decompose if "Mix of Tools" is selected
-            subtasks = await a_decompose_subtasks(current_task, schema, parent_context)
-            if subtasks:
-                new_parent_context = f"{parent_context}\nParent task: {current_task['task_description']}"
-                for subtask in subtasks:
-                    task_queue.append((subtask, current_depth + 1, current_task, new_parent_context))
-        else:
-            current_task['result'] = await execute_task(current_task)
-
-    return root_task, tasks_by_depth
\ No newline at end of file
+            parent_context = context.for_task(current_task)
+            subtasks = index.lookup(current_task, schema, max_subtasks) if index else None
+            if subtasks is None and stream:
+                expansions: List[Tuple[Dict, asyncio.Task]] = []
+                selector = SiblingToolSelector(schema, current_depth + 1, max_depth)
+
+                async def expand_streamed(subtask: Dict, selection: asyncio.Future) -> bool:
+                    return await expand(subtask, current_depth + 1, current_task, await selection)
+
+                def dispatch(subtask: Dict):
+                    if task_manager.get_task_count() >= task_manager.max_tasks:
+                        return  # expand() would reject it, do not pay for its tool selection
+                    expansions.append((subtask, asyncio.create_task(expand_streamed(subtask, selector.add(subtask)))))
+
+                try:
+                    subtasks = await a_decompose_subtasks(current_task, schema, parent_context, on_subtask=dispatch, max_subtasks=max_subtasks)
+                    selector.flush()
+                    added = await asyncio.gather(*(expansion for _, expansion in expansions))
+                except BaseException:
+                    selector.cancel()
+                    for _, expansion in expansions:
+                        expansion.cancel()
+                    raise
+                if subtasks:
+                    decomposed.append((current_task, subtasks))
+                    if evaluator:
+                        evaluator.submit(current_task, subtasks)
+                    tree.reorder_children(current_task, [subtask for (subtask, _), ok in zip(expansions, added) if ok])
+                return True
+            if subtasks is None:
+                subtasks = await a_decompose_subtasks(current_task, schema, parent_context, max_subtasks=max_subtasks)
+                if subtasks:
+                    decomposed.append((current_task, subtasks))
+                    if evaluator:
+                        evaluator.submit(current_task, subtasks)
+            if subtasks and task_manager.get_task_count() < task_manager.max_tasks:
+                # One batched call selects the tools of all siblings
+                selected_tools = await a_select_tools(subtasks, schema, current_depth + 1, max_depth)
+                added = await asyncio.gather(*(
+                    expand(subtask, current_depth + 1, current_task, subtask_tool)
+                    for subtask, subtask_tool in zip(subtasks, selected_tools)
+                ))
+                # Siblings finish in any order, keep them in decomposition order
+                tree.reorder_children(current_task, [subtask for subtask, ok in zip(subtasks, added) if ok])
+        return True
+
+    def stop_at_deadline() -> Dict:
+        """Turns the nodes still waiting for their decomposition into leaves, so the partial tree can run."""
+        budget.deadline_hit = True
+        if task_manager.root is None:
+            task['selected_tool'] = BUDGET_LEAF_TOOL
+            task['depth'] = 0
+            task_manager.add_task(task)
+            if events:
+                events.node_added(task, None)
+                events.tool_selected(task)
+            if executor:
+                executor.submit(task)
+        for planned in list(tree):
+            if planned.get('selected_tool') == 'D' and not planned.get('duplicate_of') and not tree.children(planned):
+                planned['selected_tool'] = BUDGET_LEAF_TOOL
+                if events:
+                    events.tool_selected(planned)
+                if executor:
+                    executor.submit(planned)
+        print(f"Deadline reached, returning the {task_manager.get_task_count()} tasks planned so far")
+        return task_manager.root
+
+    try:
+        with metrics.timer("plan"):
+            try:
+                root_task = task if await asyncio.wait_for(expand(task, 0, None), budget.seconds_left() if budget else None) else None
+            except asyncio.TimeoutError:
+                if not budget or budget.deadline is None:
+                    raise
+                root_task = stop_at_deadline()
+    except BaseException:
+        if executor:
+            executor.cancel()
+        raise
+    if index and root_task:
+        for decomposed_task, subtasks in decomposed:
+            index.add(decomposed_task, subtasks)
+    if similarity_index and similarity_index.merged:
+        print(f"Merged {similarity_index.merged} duplicate subtasks")
+    if executor:
+        await executor.finish(root_task, budget.seconds_left() if budget else None)
+        if executor.cancelled:
+            budget.deadline_hit = True
+    tasks_by_depth = tree.by_depth() if root_task else {}
+
+    return root_task, tasks_by_depth
@@ -0,0 +1,80 @@
+# planning_budget.py
+import contextvars
+import time
+from typing import Any, Dict, Optional
+from config import BUDGET_RESERVE_AT_ROOT, BUDGET_RESERVE_AT_MAX_DEPTH, BUDGET_LOW_VALUE_FACTOR
+
+class PlanningBudget:
+    """Wall-clock deadline and token/cost budget of one task tree request.
+
+    Model calls made while the budget is current (see current_budget) are charged to it as they complete.
+    The planner asks allows_decomposition() before decomposing a node, so it falls back to leaf tools as
+    the budget shrinks, and stops planning at the deadline. Limits left as None are unbounded."""
+
+    def __init__(self, deadline_seconds: Optional[float] = None, max_tokens: Optional[int] = None, max_cost_usd: Optional[float] = None):
+        for name, limit in (("deadline_seconds", deadline_seconds), ("max_tokens", max_tokens), ("max_cost_usd", max_cost_usd)):
+            if limit is not None and (isinstance(limit, bool) or not isinstance(limit, (int, float)) or limit <= 0):
+                raise ValueError(f"{name} must be a positive number")
+        self.started = time.monotonic()
+        self.deadline_seconds = deadline_seconds
+        self.deadline = self.started + deadline_seconds if deadline_seconds else None
+        self.max_tokens = max_tokens
+        self.max_cost_usd = max_cost_usd
+        self.tokens = 0
+        self.cost_usd = 0.0
+        self.leaf_fallbacks = 0  # Nodes planned as leaves instead of being decomposed
+        self.deadline_hit = False
+
+    def charge(self, tokens: int, cost_usd: float):
+        self.tokens += tokens
+        self.cost_usd += cost_usd
+
+    def seconds_left(self) -> Optional[float]:
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def remaining(self) -> float:
+        """Share of the tightest limit still unspent, from 1.0 (untouched) down to 0.0."""
+        shares = [1.0]
+        if self.deadline is not None:
+            shares.append(self.seconds_left() / self.deadline_seconds)
+        if self.max_tokens:
+            shares.append(1 - self.tokens / self.max_tokens)
+        if self.max_cost_usd:
+            shares.append(1 - self.cost_usd / self.max_cost_usd)
+        return max(0.0, min(shares))
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows_decomposition(self, task: Dict, parent_task: Optional[Dict], depth: int, max_depth: int) -> bool:
+        """Whether enough budget is left to decompose task rather than planning it as a leaf.
+
+        The share that must remain grows linearly from BUDGET_RESERVE_AT_ROOT at the root to
+        BUDGET_RESERVE_AT_MAX_DEPTH at max_depth, since deep expansions pay off least. Low-value branches,
+        which produce none of their parent's outputs, need BUDGET_LOW_VALUE_FACTOR times as much."""
+        reserve = BUDGET_RESERVE_AT_ROOT + (BUDGET_RESERVE_AT_MAX_DEPTH - BUDGET_RESERVE_AT_ROOT) * min(depth / max(max_depth, 1), 1.0)
+        if parent_task is not None and not is_on_data_path(task, parent_task):
+            reserve *= BUDGET_LOW_VALUE_FACTOR
+        return self.remaining() > reserve
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "max_tokens": self.max_tokens,
+            "tokens": self.tokens,
+            "max_cost_usd": self.max_cost_usd,
+            "cost_usd": round(self.cost_usd, 6),
+            "remaining": round(self.remaining(), 3),
+            "leaf_fallbacks": self.leaf_fallbacks,
+            "deadline_hit": self.deadline_hit,
+        }
+
+def is_on_data_path(task: Dict, parent_task: Dict) -> bool:
+    """Whether task produces any of its parent's outputs (tasks without declared outputs count as on it)."""
+    parent_outputs = {link["link_name"] for link in parent_task.get("produces", [])}
+    return not parent_outputs or any(link["link_name"] in parent_outputs for link in task.get("produces", []))
+
+# Budget of the request being planned, inherited by the tasks it spawns; model calls are charged to it
+current_budget: contextvars.ContextVar[Optional[PlanningBudget]] = contextvars.ContextVar("current_budget", default=None)
@@ -0,0 +1,44 @@
+# prompt_compiler.py
+import json
+from functools import lru_cache
+from typing import Any, Dict, List
+from langchain.schema import HumanMessage, SystemMessage
+from schemas import Task
+
+def minify_schema(schema: Dict) -> str:
+    """Serializes a JSON schema without whitespace or the auto-generated 'title' entries."""
+    def strip_titles(node: Any, is_properties: bool = False) -> Any:
+        if isinstance(node, dict):
+            return {
+                key: strip_titles(value, key in ("properties", "$defs") and not is_properties)
+                for key, value in node.items()
+                if is_properties or key != "title"
+            }
+        if isinstance(node, list):
+            return [strip_titles(item) for item in node]
+        return node
+    return json.dumps(strip_titles(schema), separators=(",", ":"))
+
+# Computed once at startup; every prompt embeds this exact string so the prefix stays stable
+TASK_SCHEMA = Task.model_json_schema()
+TASK_SCHEMA_STRING = minify_schema(TASK_SCHEMA)
+
+@lru_cache(maxsize=64)
+def _minified(canonical_schema: str) -> str:
+    return minify_schema(json.loads(canonical_schema))
+
+def schema_string(schema: Dict) -> str:
+    """Returns the minified string for a schema, reusing the precomputed Task schema string.
+
+    Other schemas are cached by content, so equal schemas share one entry and none is kept alive by the cache."""
+    if schema is TASK_SCHEMA or schema == TASK_SCHEMA:
+        return TASK_SCHEMA_STRING
+    return _minified(json.dumps(schema, sort_keys=True))
+
+def compile_prompt(static_prefix: str, variable_content: str) -> List:
+    """Builds the messages for a call with all static content first, so providers can cache the prefix."""
+    return [SystemMessage(content=static_prefix), HumanMessage(content=variable_content)]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) for providers that do not report usage."""
+    return (len(text) + 3) // 4
@@ -0,0 +1,189 @@
+# rate_limiter.py
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config import RATE_LIMITS, DEFAULT_RATE_LIMIT, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS, MODEL_CALL_RETRIES, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute, holding at most one minute of budget.
+
+    Reservations may drive the balance negative; the caller then sleeps until it is paid back, which keeps
+    reservation atomic without an asyncio lock (so one bucket can serve several event loops)."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes amount from the bucket and returns how long to wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """Charges (or refunds, if negative) the difference between estimated and actual usage."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and lets a single trial call through after reset_seconds."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def before_call(self, provider: str) -> bool:
+        """Raises CircuitOpenError unless a call may go through; returns True if that call is the half-open trial."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_flight):
+            raise CircuitOpenError(f"Circuit breaker for {provider} is open after {self.failures} consecutive failures")
+        if state == "half_open":
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def end_trial(self):
+        """Called however the trial call ended; a trial that was neither a success nor a recorded failure
+        (cancelled, or failed with a non-retryable error) re-opens the circuit for another reset period."""
+        if self.trial_in_flight:
+            self.trial_in_flight = False
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class ProviderLimiter:
+    """Request and token budgets plus a circuit breaker for one provider."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.breaker = CircuitBreaker()
+        self.throttled_seconds = 0.0
+        self.retries = 0
+
+    async def acquire(self, estimated_tokens: int):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            self.throttled_seconds += wait
+            await asyncio.sleep(wait)
+
+_limiters: Dict[str, ProviderLimiter] = {}
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    if provider not in _limiters:
+        limits = RATE_LIMITS.get(provider, DEFAULT_RATE_LIMIT)
+        _limiters[provider] = ProviderLimiter(limits["requests_per_minute"], limits["tokens_per_minute"])
+    return _limiters[provider]
+
+def reset_limiters():
+    """Drops every provider's limiter; the next call rebuilds it from RATE_LIMITS."""
+    _limiters.clear()
+
+def set_limiter(provider: str, limiter: ProviderLimiter):
+    """Overrides a provider's limiter, e.g. with unbounded limits for offline benchmarks."""
+    _limiters[provider] = limiter
+
+def status_code(error: Exception) -> Optional[int]:
+    for source in (error, getattr(error, "response", None)):
+        code = getattr(source, "status_code", None) or getattr(source, "status", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Reads a Retry-After header (in seconds) from the provider's error response, if there is one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    message = str(error).lower()
+    return "rate limit" in message or "429" in message or "overloaded" in message or "timed out" in message
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter; a server-provided Retry-After takes precedence."""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS) + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+async def a_call_with_limits(provider: str, call: Callable[[], Awaitable[Any]], estimated_tokens: int, retries: int = MODEL_CALL_RETRIES,
+                             on_retry: Optional[Callable[[], None]] = None) -> Any:
+    """Runs a model call within the provider's rate limits, retrying transient failures with backoff."""
+    limiter = get_limiter(provider)
+    for attempt in range(retries):
+        trial = limiter.breaker.before_call(provider)
+        try:
+            await limiter.acquire(estimated_tokens)
+            result = await call()
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            limiter.breaker.record_failure()
+            if attempt == retries - 1:
+                raise
+            error = e
+        else:
+            limiter.breaker.record_success()
+            return result
+        finally:
+            if trial:
+                limiter.breaker.end_trial()
+        limiter.retries += 1
+        if on_retry:
+            on_retry()
+        delay = backoff_delay(attempt, retry_after_seconds(error))
+        print(f"{provider} call failed ({error}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+def rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        provider: {
+            "circuit": limiter.breaker.state,
+            "consecutive_failures": limiter.breaker.failures,
+            "retries": limiter.retries,
+            "throttled_seconds": round(limiter.throttled_seconds, 3),
+        }
+        for provider, limiter in _limiters.items()
+    }
@@ -0,0 +1,85 @@
+# scheduler.py
+import threading
+from typing import Dict, List
+import networkx as nx
+from config import TOOL_COST_SECONDS, LATENCY_EWMA_ALPHA
+from link_registry import LinkRegistry
+from task_tree import LinkIndex
+
+class LatencyHistory:
+    """Exponentially weighted mean execution time per tool, seeded with the configured estimates."""
+
+    def __init__(self, alpha: float = LATENCY_EWMA_ALPHA):
+        self.alpha = alpha
+        self.means: Dict[str, float] = dict(TOOL_COST_SECONDS)
+        self._lock = threading.Lock()
+
+    def estimate(self, tool: str) -> float:
+        return self.means.get(tool, max(TOOL_COST_SECONDS.values()))
+
+    def record(self, tool: str, seconds: float):
+        with self._lock:
+            previous = self.means.get(tool)
+            self.means[tool] = seconds if previous is None else (1 - self.alpha) * previous + self.alpha * seconds
+
+latency_history = LatencyHistory()
+
+class CriticalPathScheduler:
+    """Tracks the producer -> consumer DAG of submitted leaves and ranks them for execution slots.
+
+    A leaf's priority is its bottom level: its own estimated cost plus the longest estimated chain of work
+    that waits on its outputs, so leaves on the critical path get slots first. Edges that would close a
+    cycle are refused when the task is added, and the links behind them are reported so they can be released
+    instead of deadlocking their consumers."""
+
+    def __init__(self, links: LinkRegistry):
+        self.links = links
+        self.graph = nx.DiGraph()
+        self.index = LinkIndex(links.resolve)  # Submitted leaves by the links they produce and ingest
+        self._bottom_levels: Dict[str, float] = {}
+
+    def _add_edge(self, producer_id: str, consumer_id: str, link_id: str, cyclic_links: List[str]):
+        if producer_id == consumer_id or nx.has_path(self.graph, consumer_id, producer_id):
+            print(f"Link {link_id} from {producer_id} to {consumer_id} would create a dependency cycle")
+            cyclic_links.append(link_id)
+        else:
+            self.graph.add_edge(producer_id, consumer_id)
+
+    def add(self, task: Dict) -> List[str]:
+        """Adds a leaf and its link edges; returns the ids of links that would close a cycle."""
+        task_id = task['task_id']
+        self.graph.add_node(task_id, cost=latency_history.estimate(task.get('selected_tool')))
+        cyclic_links: List[str] = []
+        for link in task.get('produces', []):
+            link_id = self.links.resolve(link['link_id'])
+            self.index.add_producer(link_id, task_id)
+            for consumer_id in self.index.consumers_of(link_id):
+                self._add_edge(task_id, consumer_id, link_id, cyclic_links)
+        for link in task.get('ingests', []):
+            link_id = self.links.resolve(link['link_id'])
+            self.index.add_consumer(link_id, task_id)
+            for producer_id in self.index.producers_of(link_id):
+                self._add_edge(producer_id, task_id, link_id, cyclic_links)
+        self._bottom_levels = {}
+        return cyclic_links
+
+    def priority(self, task: Dict) -> float:
+        """Estimated seconds from the start of this task to the end of the longest chain depending on it."""
+        if not self._bottom_levels:
+            for task_id in reversed(list(nx.topological_sort(self.graph))):
+                self._bottom_levels[task_id] = self.graph.nodes[task_id]['cost'] + max(
+                    (self._bottom_levels[successor] for successor in self.graph.successors(task_id)), default=0.0)
+        return self._bottom_levels.get(task['task_id'], 0.0)
+
+    def critical_path(self) -> List[str]:
+        """Task ids along the longest estimated chain of dependent leaves."""
+        if self.graph.number_of_nodes() == 0:
+            return []
+        self.priority({'task_id': None})  # Fill in the bottom levels
+        levels = self._bottom_levels
+        task_id = max((node for node in self.graph if self.graph.in_degree(node) == 0), key=levels.get)
+        path = [task_id]
+        while self.graph.out_degree(task_id):
+            task_id = max(self.graph.successors(task_id), key=levels.get)
+            path.append(task_id)
+        return path
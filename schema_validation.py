@@ -0,0 +1,69 @@
+# schema_validation.py
+import copy
+from typing import Any, Callable, Dict, Tuple
+from jsonschema import ValidationError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+from prompt_compiler import TASK_SCHEMA
+
+try:
+    import fastjsonschema  # Generates Python code for each schema, several times faster than jsonschema
+except ImportError:
+    fastjsonschema = None
+
+Validator = Callable[[Any], None]
+
+def node_schema(schema: Dict) -> Dict:
+    """Copy of a task schema that only checks 'subtasks' is a list: in a tree, each subtask is validated as a node of its own."""
+    shallow = copy.deepcopy(schema)
+    definition = shallow.get("$defs", {}).get("Task", shallow)
+    if "subtasks" in definition.get("properties", {}):
+        definition["properties"]["subtasks"] = {"anyOf": [{"type": "array"}, {"type": "null"}]}
+    return shallow
+
+def compile_validator(schema: Dict) -> Validator:
+    """Builds a function that raises jsonschema's ValidationError for instances that do not match schema.
+
+    The schema is checked, and its $refs resolved, once here instead of on every call as jsonschema.validate does."""
+    if fastjsonschema is not None:
+        check = fastjsonschema.compile(schema, use_default=False)  # Never fill in defaults, validation must not mutate
+
+        def validate_compiled(instance: Any):
+            try:
+                check(instance)
+            except fastjsonschema.JsonSchemaValueException as e:
+                raise ValidationError(e.message) from None
+        return validate_compiled
+
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+
+    def validate_compiled(instance: Any):
+        error = best_match(validator.iter_errors(instance))
+        if error is not None:
+            raise error
+    return validate_compiled
+
+TASK_VALIDATOR = compile_validator(TASK_SCHEMA)
+TASK_NODE_VALIDATOR = compile_validator(node_schema(TASK_SCHEMA))
+
+_validators: Dict[Tuple[int, bool], tuple] = {}
+
+def get_validator(schema: Dict, node: bool = False) -> Validator:
+    """Returns the compiled validator for a schema, reusing the precompiled Task validators."""
+    if schema is TASK_SCHEMA or schema == TASK_SCHEMA:
+        return TASK_NODE_VALIDATOR if node else TASK_VALIDATOR
+    cached = _validators.get((id(schema), node))
+    if cached is None or cached[0] is not schema:
+        cached = (schema, compile_validator(node_schema(schema) if node else schema))
+        _validators[(id(schema), node)] = cached
+    return cached[1]
+
+def validate(instance: Any, schema: Dict):
+    """Drop-in for jsonschema.validate with a compiled, cached validator."""
+    get_validator(schema)(instance)
+
+def validate_node(task: Dict, schema: Dict = TASK_SCHEMA):
+    """Validates one task of a tree without descending into its subtasks."""
+    get_validator(schema, node=True)(task)
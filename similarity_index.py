@@ -0,0 +1,52 @@
+# similarity_index.py
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from config import SIMILARITY_THRESHOLD
+
+def task_document(task: Dict) -> str:
+    return f"{task.get('task_name', '')} {task.get('task_description', '')}"
+
+class SimilarityIndex:
+    """In-run index of planned tasks, used to spot near-duplicate subtasks produced by different branches."""
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.tasks: List[Dict] = []
+        self.aliases: Dict[str, str] = {}  # link_id produced by a merged duplicate -> link_id of the canonical link
+        self.merged = 0
+
+    def add(self, task: Dict):
+        self.tasks.append(task)
+
+    def resolve(self, link_id: str) -> str:
+        while link_id in self.aliases:
+            link_id = self.aliases[link_id]
+        return link_id
+
+    def record_merge(self, links: List[Tuple[Dict, Dict]]):
+        """Records the (duplicate, canonical) link pairs of a merge, so consumers of either count as the same inputs."""
+        self.merged += 1
+        for duplicate_link, canonical_link in links:
+            if self.resolve(canonical_link["link_id"]) != duplicate_link["link_id"]:
+                self.aliases[duplicate_link["link_id"]] = self.resolve(canonical_link["link_id"])
+
+    def find_duplicate(self, task: Dict, exclude: Iterable[Dict] = (), accept: Callable[[Dict], bool] = None) -> Optional[Dict]:
+        """Returns the indexed task most similar to task if its TF-IDF cosine similarity reaches the threshold.
+
+        Only tasks accept() returns True for are candidates. The vectorizer is refitted on every query;
+        trees are capped at MAX_TASKS nodes, so this stays cheap."""
+        excluded = {id(excluded_task) for excluded_task in exclude}
+        candidates = [indexed for indexed in self.tasks if id(indexed) not in excluded and (accept is None or accept(indexed))]
+        if not candidates:
+            return None
+        try:
+            matrix = TfidfVectorizer(stop_words="english").fit_transform([task_document(indexed) for indexed in candidates] + [task_document(task)])
+        except ValueError:  # Nothing but stop words
+            return None
+        scores = cosine_similarity(matrix[-1], matrix[:-1])[0]
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+        print(f"Task {task['task_id']} duplicates {candidates[best]['task_id']} (similarity {scores[best]:.2f})")
+        return candidates[best]
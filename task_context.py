@@ -0,0 +1,64 @@
+# task_context.py
+from typing import Dict, List
+from config import PARENT_CONTEXT_TOKEN_BUDGET, NODE_SUMMARY_TOKENS
+from prompt_compiler import estimate_tokens
+from task_tree import TaskTree
+
+# Task fields the model needs to plan; ids, results, planning state and subtasks are left out of prompts
+PROMPT_TASK_FIELDS = ("task_id", "task_name", "task_description", "ingests", "produces")
+PROMPT_LINK_FIELDS = ("link_id", "link_name", "link_description", "data_type", "data_source_type")
+
+def prompt_view(task: Dict) -> Dict:
+    """The parts of a task that belong in a prompt: no subtasks, link values or execution state."""
+    view = {field: task[field] for field in PROMPT_TASK_FIELDS if field in task}
+    for field in ("ingests", "produces"):
+        if field in view:
+            view[field] = [{key: link[key] for key in PROMPT_LINK_FIELDS if key in link} for link in view[field]]
+    return view
+
+def summarize(task: Dict, max_tokens: int = NODE_SUMMARY_TOKENS) -> str:
+    """One-line summary of a task, cut at a word boundary to about max_tokens."""
+    text = " ".join(str(task.get("task_description") or task.get("task_name", "")).split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * 4]
+    return (cut.rsplit(" ", 1)[0] if " " in cut else cut) + "..."
+
+class ParentContext:
+    """Builds the bounded ancestor context of a task for decomposition prompts.
+
+    Each ancestor is summarized once and the summary is reused by all of its descendants. Summaries are
+    added nearest-first after the immediate parent and the root, until the token budget is spent, so prompt
+    size stays flat however deep the tree grows."""
+
+    def __init__(self, tree: TaskTree, token_budget: int = PARENT_CONTEXT_TOKEN_BUDGET):
+        self.tree = tree
+        self.token_budget = token_budget
+        self.summaries: Dict[str, str] = {}  # task_id -> rendered summary line
+
+    def summary(self, task: Dict) -> str:
+        line = self.summaries.get(task["task_id"])
+        if line is None:
+            line = self.summaries[task["task_id"]] = f"Parent task: {summarize(task)}"
+        return line
+
+    def for_task(self, task: Dict) -> str:
+        """The context of task: summaries of its ancestors from the root down, within the token budget."""
+        ancestors = self.tree.ancestors(task)  # Parent first, root last
+        if not ancestors:
+            return ""
+        priority = [0, len(ancestors) - 1] + list(range(1, len(ancestors) - 1))  # Parent, root, then nearest first
+        kept: List[int] = []
+        used = 0
+        for index in dict.fromkeys(priority):
+            cost = estimate_tokens(self.summary(ancestors[index]))
+            if used + cost > self.token_budget:
+                break
+            kept.append(index)
+            used += cost
+        lines = []
+        for index in sorted(kept, reverse=True):  # Root first
+            if lines and index + 1 not in kept:
+                lines.append("(intermediate parent tasks omitted)")
+            lines.append(self.summary(ancestors[index]))
+        return "\n".join(lines)
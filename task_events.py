@@ -0,0 +1,48 @@
+# task_events.py
+import threading
+from typing import Any, Dict, List
+
+def node_payload(task: Dict) -> Dict[str, Any]:
+    """Compact view of a task for deltas: subtasks, tool and result arrive as their own deltas."""
+    return {key: value for key, value in task.items() if key not in ("subtasks", "selected_tool", "result") and value is not None}
+
+class TaskEventLog:
+    """Append-only, sequence-numbered log of task tree deltas for one job.
+
+    Deltas are emitted from the event loop thread and read from HTTP threads; a reader that reconnects
+    passes the last sequence number it saw and receives everything after it."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def emit(self, event_type: str, **fields: Any) -> Dict[str, Any]:
+        with self._condition:
+            event = {"seq": len(self.events) + 1, "type": event_type}
+            event.update({key: value for key, value in fields.items() if value is not None})
+            self.events.append(event)
+            self._condition.notify_all()
+        return event
+
+    def node_added(self, task: Dict, parent_task: Dict = None):
+        self.emit("node_added", parent_id=parent_task["task_id"] if parent_task else None, task=node_payload(task))
+
+    def tool_selected(self, task: Dict):
+        self.emit("tool_selected", task_id=task["task_id"], tool=task.get("selected_tool"))
+
+    def result_ready(self, task: Dict):
+        produced = {link["link_id"]: link.get("value") for link in task.get("produces", [])}
+        self.emit("result_ready", task_id=task["task_id"], result=task.get("result"), completed=task.get("completed", False), produced=produced)
+
+    def close(self):
+        """Marks the log as complete; readers stop once they have seen every event."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def since(self, seq: int, timeout: float = None) -> List[Dict[str, Any]]:
+        """Returns the events after seq, waiting up to timeout seconds for new ones if there are none yet."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > seq or self.closed, timeout)
+            return self.events[seq:]
@@ -1,16 +1,38 @@
 # task_manager.py
+from typing import Dict
+from jsonschema import ValidationError
 from config import MAX_TASKS
+from task_tree import TaskTree
+from schema_validation import validate_node
+from prompt_compiler import TASK_SCHEMA
 
 class TaskManager:
-    def __init__(self, max_tasks=MAX_TASKS):
-        self.tasks = []
+    def __init__(self, max_tasks=MAX_TASKS, schema: Dict = TASK_SCHEMA):
+        self.tree = TaskTree()
         self.max_tasks = max_tasks
+        self.schema = schema
+        self.planned = 0  # Tasks counted against max_tasks; merged duplicates are not
+        self.validation_errors: Dict[str, str] = {}  # task_id -> schema violation, found as tasks are added
 
-    def add_task(self, task):
-        if len(self.tasks) < self.max_tasks:
-            self.tasks.append(task)
-            return True
-        return False
+    def add_task(self, task: Dict, parent_task: Dict = None, counted: bool = True) -> bool:
+        """Adds task to the tree under parent_task, unless that would exceed max_tasks.
+
+        Each task is validated on its own as it is added, so the finished tree never needs a whole-tree pass."""
+        if counted and self.planned >= self.max_tasks:
+            return False
+        try:
+            validate_node(task, self.schema)
+        except ValidationError as e:
+            print(f"Task {task.get('task_id')} does not match the schema: {e.message}")
+            self.validation_errors[str(task.get('task_id'))] = e.message
+        self.tree.add(task, parent_task)
+        if counted:
+            self.planned += 1
+        return True
 
     def get_task_count(self):
-        return len(self.tasks)
+        return self.planned
+
+    @property
+    def root(self) -> Dict:
+        return self.tree.root
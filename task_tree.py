@@ -0,0 +1,162 @@
+# task_tree.py
+import logging
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class LinkIndex:
+    """Producer and consumer task ids per link_id.
+
+    resolve normalizes link ids before they are indexed or looked up, e.g. to follow merge aliases."""
+
+    def __init__(self, resolve: Callable[[str], str] = None):
+        self.resolve = resolve or (lambda link_id: link_id)
+        self.producers: Dict[str, List[str]] = {}
+        self.consumers: Dict[str, List[str]] = {}
+
+    def add_producer(self, link_id: str, task_id: str):
+        self.producers.setdefault(self.resolve(link_id), []).append(task_id)
+
+    def add_consumer(self, link_id: str, task_id: str):
+        self.consumers.setdefault(self.resolve(link_id), []).append(task_id)
+
+    def add(self, task: Dict):
+        for link in task.get("produces", []):
+            self.add_producer(link["link_id"], task["task_id"])
+        for link in task.get("ingests", []):
+            self.add_consumer(link["link_id"], task["task_id"])
+
+    def producers_of(self, link_id: str) -> List[str]:
+        return self.producers.get(self.resolve(link_id), [])
+
+    def consumers_of(self, link_id: str) -> List[str]:
+        return self.consumers.get(self.resolve(link_id), [])
+
+class TaskNode:
+    """Structural record of one task: the task dict itself plus its position in the tree."""
+    __slots__ = ("task", "parent", "children", "depth")
+
+    def __init__(self, task: Dict, parent: Optional["TaskNode"], depth: int):
+        self.task = task
+        self.parent = parent
+        self.children: List["TaskNode"] = []
+        self.depth = depth
+
+class TaskTree:
+    """Indexed container for a task tree.
+
+    Tasks stay plain dicts in the existing JSON shape (each parent's 'subtasks' list is kept in sync), so
+    serialization is just the root dict. The tree adds O(1) lookup by task_id, parent/children access and
+    producer/consumer indexes per link_id (see LinkIndex). Task ids are made unique on insertion, because the LLM reuses them across branches; each rename is
+    logged and kept in renamed."""
+
+    def __init__(self):
+        self.root: Optional[Dict] = None
+        self.nodes: Dict[str, TaskNode] = {}
+        self.renamed: Dict[str, str] = {}  # Unique task_id given on insertion -> task_id the task came with
+        self.links = LinkIndex()  # As the LLM wrote the link ids; merge aliases are not followed
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.nodes
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Yields every task in depth-first pre-order."""
+        if self.root is None:
+            return
+        stack = [self.nodes[self.root["task_id"]]]
+        while stack:
+            node = stack.pop()
+            yield node.task
+            stack.extend(reversed(node.children))
+
+    def _unique_id(self, task_id: str) -> str:
+        if task_id not in self.nodes:
+            return task_id
+        suffix = 2
+        while f"{task_id}-{suffix}" in self.nodes:
+            suffix += 1
+        return f"{task_id}-{suffix}"
+
+    def add(self, task: Dict, parent_task: Dict = None) -> Dict:
+        """Adds task under parent_task (or as the root) and appends it to the parent's subtasks."""
+        task_id = self._unique_id(str(task["task_id"]))
+        if task_id != task["task_id"]:
+            logger.warning("Task id %s is already in the tree, renaming it to %s", task["task_id"], task_id)
+            self.renamed[task_id] = task["task_id"]
+            task["task_id"] = task_id
+        parent = self.nodes[parent_task["task_id"]] if parent_task else None
+        node = TaskNode(task, parent, parent.depth + 1 if parent else 0)
+        self.nodes[task_id] = node
+        if parent is None:
+            self.root = task
+        else:
+            parent.children.append(node)
+            if parent_task.get('subtasks') is None:
+                parent_task['subtasks'] = []
+            parent_task['subtasks'].append(task)
+        self.links.add(task)
+        return task
+
+    def reorder_children(self, task: Dict, ordered: List[Dict]):
+        """Puts the children of task in the given order, e.g. decomposition order after concurrent expansion."""
+        node = self.nodes[task["task_id"]]
+        position = {child["task_id"]: index for index, child in enumerate(ordered)}
+        node.children.sort(key=lambda child: position.get(child.task["task_id"], len(position)))
+        task['subtasks'] = [child.task for child in node.children]
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        node = self.nodes.get(task_id)
+        return node.task if node else None
+
+    def parent(self, task: Dict) -> Optional[Dict]:
+        parent = self.nodes[task["task_id"]].parent
+        return parent.task if parent else None
+
+    def children(self, task: Dict) -> List[Dict]:
+        return [child.task for child in self.nodes[task["task_id"]].children]
+
+    def depth(self, task: Dict) -> int:
+        return self.nodes[task["task_id"]].depth
+
+    def ancestors(self, task: Dict) -> List[Dict]:
+        """Returns task's parent, grandparent, ... up to the root."""
+        chain = []
+        node = self.nodes[task["task_id"]].parent
+        while node is not None:
+            chain.append(node.task)
+            node = node.parent
+        return chain
+
+    def producers_of(self, link_id: str) -> List[Dict]:
+        return [self.nodes[task_id].task for task_id in self.links.producers_of(link_id)]
+
+    def consumers_of(self, link_id: str) -> List[Dict]:
+        return [self.nodes[task_id].task for task_id in self.links.consumers_of(link_id)]
+
+    def by_depth(self) -> Dict[int, List[Dict]]:
+        """Groups the tasks by depth, in breadth-first order."""
+        tasks_by_depth: Dict[int, List[Dict]] = {}
+        if self.root is None:
+            return tasks_by_depth
+        level = [self.nodes[self.root["task_id"]]]
+        while level:
+            tasks_by_depth[level[0].depth] = [node.task for node in level]
+            level = [child for node in level for child in node.children]
+        return tasks_by_depth
+
+    @classmethod
+    def from_dict(cls, root_task: Dict) -> "TaskTree":
+        """Indexes an existing nested task dict in place, without recursion."""
+        tree = cls()
+        stack = [(root_task, None)]
+        while stack:
+            task, parent_task = stack.pop()
+            subtasks = task.get('subtasks') or []
+            if subtasks:
+                task['subtasks'] = []  # Refilled by add() as the children are indexed
+            tree.add(task, parent_task)
+            stack.extend((subtask, task) for subtask in reversed(subtasks))
+        return tree
@@ -0,0 +1,11 @@
+# tests/conftest.py
+import os
+import sys
+
+# The modules live at the repository root; keep the tests offline and free of on-disk caches
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("PERPLEXITY_API_KEY", "GOOGLE_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(key, "test")
+os.environ["LLM_CACHE_ENABLED"] = "false"
+os.environ["DECOMPOSITION_INDEX_ENABLED"] = "false"
+os.environ["JOURNAL_MODE"] = "off"
@@ -0,0 +1,38 @@
+# tests/test_cache_store.py
+import os
+from cache_store import DiskCache
+
+def test_database_is_opened_on_first_use(tmp_path):
+    path = tmp_path / "cache" / "store.sqlite"
+    cache = DiskCache(str(path))
+    assert not path.parent.exists()
+    cache.set("key", {"value": 1})
+    assert cache.get("key") == {"value": 1}
+    assert os.path.exists(path)
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = DiskCache(str(tmp_path / "store.sqlite"), ttl_seconds=60)
+    cache.set("key", "value")
+    cache._db().execute("UPDATE cache SET created_at = created_at - 120")
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path / "store.sqlite"), max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache._db().execute("UPDATE cache SET last_access = last_access - 10 WHERE key = 'b'")
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+def test_namespaces_share_a_file_with_their_own_ttl(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    search = DiskCache(path, namespace="llm_search", ttl_seconds=60)
+    general = DiskCache(path, namespace="llm", ttl_seconds=3600)
+    search.set("key", "search")
+    general.set("key", "general")
+    search._db().execute("UPDATE cache SET created_at = created_at - 120")
+    search._db().commit()
+    assert search.get("key") is None
+    assert general.get("key") == "general"
@@ -0,0 +1,26 @@
+# tests/test_code_runner.py
+import asyncio
+import code_runner
+from code_runner import CodeWorkerPool
+
+def test_jobs_fail_fast_once_no_worker_can_be_restarted(monkeypatch):
+    monkeypatch.setattr(code_runner, "BACKOFF_BASE_SECONDS", 0.01)
+
+    async def main():
+        pool = CodeWorkerPool(size=1, timeout=1)
+        await pool.start()
+
+        async def cannot_start():
+            raise OSError("too many processes")
+        pool._new_worker = cannot_start
+        try:
+            # The first job kills its worker; the second is already waiting for it when the restart is given up
+            timed_out, waiting = await asyncio.gather(pool.run("while True: pass"), pool.run("print(1)"))
+            later = await asyncio.wait_for(pool.run("print(2)"), 1)
+        finally:
+            await pool.close()
+        return timed_out, waiting, later
+
+    timed_out, waiting, later = asyncio.run(main())
+    assert "timed out" in timed_out.error
+    assert "No code worker" in waiting.error and "No code worker" in later.error
@@ -0,0 +1,27 @@
+# tests/test_decomposition_index.py
+import pytest
+from decomposition_index import DecompositionIndex
+from prompt_compiler import TASK_SCHEMA
+
+def task(task_id, description):
+    return {"task_id": task_id, "task_name": "", "task_description": description, "ingests": [], "produces": []}
+
+def subtask(task_id, description):
+    return dict(task(task_id, description), subtasks=[])
+
+@pytest.fixture
+def index(tmp_path):
+    index = DecompositionIndex(path=str(tmp_path / "decompositions.sqlite"))
+    index.add(task("1", "compare prices of flights to paris"), [subtask("1.1", "search flights to paris")])
+    return index
+
+def test_unseen_terms_do_not_match(index):
+    assert index.lookup(task("7", "compare prices of flights to tokyo"), TASK_SCHEMA) is None
+
+def test_extra_terms_do_not_match(index):
+    assert index.lookup(task("7", "compare prices of flights to paris and hotels"), TASK_SCHEMA) is None
+
+def test_same_content_terms_reuse_the_decomposition(index):
+    subtasks = index.lookup(task("7", "Compare the prices of flights to Paris!"), TASK_SCHEMA)
+    assert [subtask["task_id"] for subtask in subtasks] == ["7/1.1"]
+    assert index.stats()["hits"] == 1
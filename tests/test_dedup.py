@@ -0,0 +1,43 @@
+# tests/test_dedup.py
+from link_registry import matching_links
+from similarity_index import SimilarityIndex
+
+def link(link_id, link_name):
+    return {"link_id": link_id, "link_name": link_name, "link_description": "", "data_type": "string", "data_source_type": "llm"}
+
+def format_task(task_id, ingests, produces):
+    return {"task_id": task_id, "task_name": "Format results as table", "task_description": "Format the results as a markdown table",
+            "ingests": ingests, "produces": produces}
+
+def test_different_inputs_do_not_match():
+    canonical = format_task("1.1", [link("flights", "flights")], [link("table-1", "table")])
+    duplicate = format_task("2.1", [link("hotels", "hotels")], [link("table-2", "table")])
+    assert matching_links(duplicate, canonical) is None
+
+def test_outputs_must_match_by_name():
+    canonical = format_task("1.1", [link("flights", "flights")], [link("table-1", "table")])
+    duplicate = format_task("2.1", [link("flights", "flights")], [link("report-2", "report")])
+    assert matching_links(duplicate, canonical) is None
+
+def test_same_inputs_pair_outputs_by_name():
+    canonical = format_task("1.1", [link("flights", "flights")], [link("table-1", "table"), link("summary-1", "summary")])
+    duplicate = format_task("2.1", [link("flights", "flights")], [link("summary-2", "summary")])
+    assert [(ours["link_id"], theirs["link_id"]) for ours, theirs in matching_links(duplicate, canonical)] == [("summary-2", "summary-1")]
+
+def test_index_skips_similar_tasks_with_other_inputs():
+    index = SimilarityIndex(threshold=0.8)
+    other_inputs = format_task("1.1", [link("hotels", "hotels")], [link("table-1", "table")])
+    same_inputs = format_task("1.2", [link("flights", "flights")], [link("table-2", "table")])
+    index.add(other_inputs)
+    index.add(same_inputs)
+    task = format_task("2.1", [link("flights", "flights")], [link("table-3", "table")])
+    accept = lambda candidate: matching_links(task, candidate, index.resolve) is not None
+    assert index.find_duplicate(task, accept=accept) is same_inputs
+
+def test_inputs_produced_by_merged_duplicates_count_as_the_same():
+    index = SimilarityIndex()
+    index.record_merge([(link("prices-2", "prices"), link("prices-1", "prices"))])
+    canonical = format_task("1.1", [link("prices-1", "prices")], [link("table-1", "table")])
+    duplicate = format_task("2.1", [link("prices-2", "prices")], [link("table-2", "table")])
+    assert matching_links(duplicate, canonical) is None
+    assert matching_links(duplicate, canonical, index.resolve) is not None
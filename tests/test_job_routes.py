@@ -0,0 +1,38 @@
+# tests/test_job_routes.py
+import asyncio
+import pytest
+import job_manager
+import new_main
+from job_manager import JobManager
+
+@pytest.fixture
+def client(monkeypatch):
+    """A test client whose jobs keep planning until the job manager is closed."""
+    async def slow_generate(*args, **kwargs):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(job_manager, "a_generate_task_tree", slow_generate)
+    manager = JobManager()
+    monkeypatch.setattr(new_main, "_job_manager", manager)
+    yield new_main.app.test_client()
+    manager.close()
+
+def test_sync_route_answers_202_with_job_id_after_timeout(client, monkeypatch):
+    monkeypatch.setattr(new_main, "SYNC_GENERATE_TIMEOUT_SECONDS", 0.1)
+    response = client.post("/api/generate_task_tree", json={"prompt": "Plan a trip"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    assert response.headers["Location"] == f"/api/jobs/{job_id}"
+    assert client.get(f"/api/jobs/{job_id}").get_json()["status"] in ("queued", "running")
+
+def test_events_reject_negative_since(client):
+    job_id = client.post("/api/jobs", json={"prompt": "Plan a trip"}).get_json()["job_id"]
+    assert client.get(f"/api/jobs/{job_id}/events?since=-1").status_code == 400
+    assert client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "-5"}).status_code == 400
+
+def test_close_stops_the_loop_thread(client):
+    manager = new_main._job_manager
+    client.post("/api/jobs", json={"prompt": "Plan a trip"})
+    assert manager.stats()["jobs"] in ({"queued": 1}, {"running": 1})
+    manager.close()
+    assert not manager._thread.is_alive() and manager.loop.is_closed()
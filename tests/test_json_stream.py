@@ -0,0 +1,24 @@
+# tests/test_json_stream.py
+import pytest
+from config import clean_json
+from json_stream import JsonObjectStream, extract_json_object
+
+@pytest.mark.parametrize("text, expected", [
+    ('Reasoning: fine.\nAction: {"k": "v"} trailing', '{"k": "v"}'),
+    ('{"a": {"b": "}"}, "c": 1}', '{"a": {"b": "}"}, "c": 1}'),  # Braces in strings do not count
+    ('note "a {" then {"k": "v"}', '{"k": "v"}'),  # A quote in prose before the object
+    ('{"outer": {"inner": 1}', '{"inner": 1}'),  # Truncated reply
+    ('no object } here "{', ''),
+])
+def test_extract_json_object(text, expected):
+    assert extract_json_object(text) == expected
+
+def test_clean_json_prefers_fenced_block():
+    assert clean_json('{"a": 1}\n```json\n{"b": 2}\n```') == '{"b": 2}'
+    assert clean_json('Action: note "a {" then {"k": "v"}') == '{"k": "v"}'
+
+def test_stream_yields_objects_across_chunks_after_marker():
+    stream = JsonObjectStream(start_marker="Action:")
+    reply = 'Reasoning: {not output}\nAct' + 'ion: [{"a": "x}"},' + ' {"b": {"c": 1}}]'
+    objects = stream.feed(reply[:20]) + stream.feed(reply[20:40]) + stream.feed(reply[40:])
+    assert objects == ['{"a": "x}"}', '{"b": {"c": 1}}']
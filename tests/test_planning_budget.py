@@ -0,0 +1,62 @@
+# tests/test_planning_budget.py
+import asyncio
+import pytest
+import config
+import rate_limiter
+from dag_executor import PipelinedExecutor
+from fake_chat_model import FakeChatModel
+from orchestration import a_generate_task_tree
+from planning_budget import PlanningBudget, current_budget, is_on_data_path
+from schemas import Task
+from task_manager import TaskManager
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Points every provider at a deterministic local model, without caching or rate limits."""
+    fake = FakeChatModel(fanout=3, latency_seconds=0.05)
+    for chat_model in config.chat_models.values():
+        monkeypatch.setattr(chat_model, "model", fake)
+        monkeypatch.setattr(chat_model, "cache", None)
+    monkeypatch.setattr(rate_limiter, "_limiters", {provider: rate_limiter.ProviderLimiter(10 ** 9, 10 ** 9) for provider in config.chat_models})
+    return fake
+
+def plan(budget, max_tasks=200, executor=None):
+    task_manager = TaskManager(max_tasks=max_tasks)
+    root_task, _ = asyncio.run(a_generate_task_tree("Plan a trip", Task.model_json_schema(), task_manager, max_depth=4,
+                                                    reuse_decompositions=False, budget=budget, executor=executor))
+    return root_task, task_manager
+
+@pytest.mark.parametrize("limits", [{"max_tokens": 0}, {"deadline_seconds": -1}, {"max_cost_usd": "1"}, {"max_tokens": True}])
+def test_limits_must_be_positive_numbers(limits):
+    with pytest.raises(ValueError):
+        PlanningBudget(**limits)
+
+def test_reserve_grows_with_depth_and_for_low_value_branches():
+    budget = PlanningBudget(max_tokens=1000)
+    budget.charge(700, 0.0)  # 30% left
+    parent = {"produces": [{"link_name": "report"}]}
+    on_path = {"produces": [{"link_name": "report"}]}
+    off_path = {"produces": [{"link_name": "notes"}]}
+    assert is_on_data_path(on_path, parent) and not is_on_data_path(off_path, parent)
+    assert budget.allows_decomposition(on_path, parent, depth=1, max_depth=5)
+    assert not budget.allows_decomposition(on_path, parent, depth=5, max_depth=5)
+    assert not budget.allows_decomposition(off_path, parent, depth=1, max_depth=5)
+
+def test_token_budget_is_charged_without_setting_current_budget(fake_model):
+    _, unbounded = plan(None)
+    budget = PlanningBudget(max_tokens=20000)
+    _, bounded = plan(budget)
+    assert current_budget.get() is None  # Reset once the tree is built
+    assert budget.tokens > 0 and budget.leaf_fallbacks > 0
+    assert bounded.get_task_count() < unbounded.get_task_count()
+    assert not [task for task in bounded.tree if task["selected_tool"] == "D" and not bounded.tree.children(task)]
+
+def test_deadline_returns_partial_tree_and_cancels_execution(fake_model, monkeypatch):
+    monkeypatch.setattr(fake_model, "latency_seconds", 0.2)
+    monkeypatch.setattr("planning_budget.BUDGET_RESERVE_AT_ROOT", 0.0)
+    monkeypatch.setattr("planning_budget.BUDGET_RESERVE_AT_MAX_DEPTH", 0.0)
+    budget = PlanningBudget(deadline_seconds=1.0)
+    root_task, task_manager = plan(budget, executor=PipelinedExecutor())
+    assert root_task is not None and budget.deadline_hit
+    assert budget.stats()["elapsed_seconds"] < 1.5  # Neither planning nor execution ran past the deadline
+    assert not [task for task in task_manager.tree if task["selected_tool"] == "D" and not task_manager.tree.children(task)]
@@ -0,0 +1,72 @@
+# tests/test_rate_limiter.py
+import asyncio
+import pytest
+import rate_limiter
+from rate_limiter import CircuitBreaker, CircuitOpenError, a_call_with_limits, get_limiter
+
+class ServerError(Exception):
+    status_code = 503
+
+@pytest.fixture
+def provider():
+    """A fresh provider whose circuit is half-open: failed enough to open, and past its reset period."""
+    name = "test-provider"
+    rate_limiter._limiters.pop(name, None)
+    limiter = get_limiter(name)
+    limiter.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    limiter.breaker.record_failure()
+    limiter.breaker.opened_at -= 60
+    assert limiter.breaker.state == "half_open"
+    yield name
+    rate_limiter._limiters.pop(name, None)
+
+def test_breaker_opens_after_threshold_and_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("p")
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_successful_trial_closes_circuit(provider):
+    async def ok():
+        return "reply"
+    assert asyncio.run(a_call_with_limits(provider, ok, 1)) == "reply"
+    assert get_limiter(provider).breaker.state == "closed"
+
+def test_non_retryable_trial_failure_reopens_circuit(provider):
+    async def bad_request():
+        raise ValueError("bad request")
+    with pytest.raises(ValueError):
+        asyncio.run(a_call_with_limits(provider, bad_request, 1))
+    breaker = get_limiter(provider).breaker
+    assert not breaker.trial_in_flight
+    assert breaker.state == "open"
+    breaker.opened_at -= 60  # Once the reset period is over, another trial is let through
+    assert breaker.before_call(provider)
+
+def test_cancelled_trial_reopens_circuit(provider):
+    async def main():
+        async def hang():
+            await asyncio.sleep(60)
+        call = asyncio.create_task(a_call_with_limits(provider, hang, 1))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+    asyncio.run(main())
+    breaker = get_limiter(provider).breaker
+    assert not breaker.trial_in_flight
+    assert breaker.state == "open"
+
+def test_retryable_trial_failure_reopens_circuit(provider):
+    async def unavailable():
+        raise ServerError("service unavailable")
+    with pytest.raises(ServerError):
+        asyncio.run(a_call_with_limits(provider, unavailable, 1, retries=1))
+    breaker = get_limiter(provider).breaker
+    assert not breaker.trial_in_flight
+    assert breaker.state == "open"
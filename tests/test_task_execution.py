@@ -0,0 +1,141 @@
+# tests/test_task_execution.py
+import asyncio
+import threading
+import types
+import pytest
+import code_runner
+import task_execution
+from code_runner import close_code_worker_pool
+from artifact_cache import ArtifactCache
+from config import CODE_TOOL, COMPUTER_USE_TOOL
+from link_registry import LinkRegistry
+from vm_pool import FakeInstance, FakeInstanceProvider, VMPool
+
+CODE = 'print(json.dumps({"total": inputs["count"] + 1}))'
+
+def code_task():
+    return {
+        "task_id": "1", "task_name": "Add one", "task_description": "Add one to the count", "selected_tool": CODE_TOOL,
+        "ingests": [{"link_id": "l1", "link_name": "count", "link_description": "", "data_type": "integer", "data_source_type": "Task"}],
+        "produces": [{"link_id": "l2", "link_name": "total", "link_description": "", "data_type": "integer", "data_source_type": "Task"}],
+    }
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Counts code generations and code worker runs."""
+    calls = {"generate": 0, "run": 0}
+
+    async def generate_code(task_description, input_schema, output_schema):
+        calls["generate"] += 1
+        return f"```python\n{CODE}\n```"
+
+    run = code_runner.CodeWorkerPool.run
+
+    async def counted_run(pool, code, inputs=None):
+        calls["run"] += 1
+        return await run(pool, code, inputs)
+
+    monkeypatch.setattr(task_execution, "a_generate_code", generate_code)
+    monkeypatch.setattr(code_runner.CodeWorkerPool, "run", counted_run)
+    return calls
+
+def execute(task, inputs):
+    async def main():
+        links = LinkRegistry()
+        try:
+            result = await task_execution.execute_task(task, inputs, links)
+        finally:
+            await close_code_worker_pool()
+        return result, links.get(task["produces"][0]).value
+    return asyncio.run(main())
+
+def test_code_leaf_runs_in_code_worker_pool(generated, monkeypatch):
+    monkeypatch.setattr(task_execution, "artifact_cache", None)
+    result, total = execute(code_task(), {"count": 41})
+    assert total == 42 and '"total": 42' in result
+    assert generated == {"generate": 1, "run": 1}
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / "artifacts.sqlite"))
+    monkeypatch.setattr(task_execution, "artifact_cache", cache)
+    return cache
+
+def test_artifact_cache_miss_stores_code_and_output(generated, cache):
+    result, _ = execute(code_task(), {"count": 1})
+    task = code_task()
+    schemas = ({"count": "integer"}, {"total": "integer"})
+    assert cache.get_code(task["task_description"], *schemas) == CODE
+    assert cache.get_output(CODE, {"count": 1}) == result
+
+def test_artifact_cache_hits_skip_generation_and_execution(generated, cache):
+    execute(code_task(), {"count": 1})
+    _, total = execute(code_task(), {"count": 1})
+    assert total == 2 and generated == {"generate": 1, "run": 1}
+    _, total = execute(code_task(), {"count": 5})  # Cached code, new inputs
+    assert total == 6 and generated == {"generate": 1, "run": 2}
+
+def test_artifact_cache_drops_code_and_output_that_fail_to_parse(generated, cache):
+    task = code_task()
+    schemas = ({"count": "integer"}, {"total": "integer"})
+    cache.put_code(task["task_description"], *schemas, CODE)
+    cache.put_output(CODE, {"count": 1}, "not json")
+    result, _ = execute(task, {"count": 1})
+    assert result.startswith("Code execution error")
+    assert cache.get_code(task["task_description"], *schemas) is None
+    assert cache.get_output(CODE, {"count": 1}) is None
+    _, total = execute(code_task(), {"count": 1})  # Generated and run again
+    assert total == 2 and generated == {"generate": 1, "run": 1}
+
+class StreamingInstance(FakeInstance):
+    def __init__(self):
+        super().__init__("fake-1")
+        self.stream_threads = []
+
+    def get_stream_url(self):
+        self.stream_threads.append(threading.current_thread())
+        return types.SimpleNamespace(stream_url="http://stream")
+
+def test_stream_tab_opens_off_the_loop_and_only_interactively(monkeypatch):
+    opened = []
+    monkeypatch.setattr(task_execution.webbrowser, "open_new_tab", opened.append)
+    instance = StreamingInstance()
+
+    async def initialize():
+        return await task_execution.ScrapybaraStateMachine(None, instance, None).initialize(task_execution.InputType.TEXT)
+
+    assert asyncio.run(initialize())
+    assert opened == ["http://stream"] and instance.stream_threads[0] is not threading.main_thread()
+    token = task_execution.interactive.set(False)
+    try:
+        assert asyncio.run(initialize())
+    finally:
+        task_execution.interactive.reset(token)
+    assert len(opened) == 1 and len(instance.stream_threads) == 1
+
+def test_server_jobs_never_wait_on_stdin(monkeypatch):
+    provider = FakeInstanceProvider()
+    provider.client = types.SimpleNamespace(act=lambda **kwargs: "I could not find it")
+    pool = VMPool(provider, size=1)
+
+    async def generate_prompt(task_description, inputs, output_schema):
+        return task_description
+
+    def no_stdin(*args):
+        raise AssertionError("input() called")
+
+    monkeypatch.setattr(task_execution, "get_vm_pool", lambda: pool)
+    monkeypatch.setattr(task_execution, "a_generate_llm_prompt", generate_prompt)
+    monkeypatch.setattr("builtins.input", no_stdin)
+    for tool in ("BashTool", "ComputerTool", "EditTool"):
+        monkeypatch.setattr(task_execution, tool, lambda instance: None)
+    task = dict(code_task(), selected_tool=COMPUTER_USE_TOOL)
+
+    async def main():
+        task_execution.interactive.set(False)
+        try:
+            return await task_execution.execute_task(task, {"count": 1}, LinkRegistry())
+        finally:
+            await pool.close()
+
+    assert asyncio.run(main()) == "I could not find it"
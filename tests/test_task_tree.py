@@ -0,0 +1,24 @@
+# tests/test_task_tree.py
+from task_tree import LinkIndex, TaskTree
+
+def test_reused_task_ids_are_renamed_and_recorded(caplog):
+    tree = TaskTree()
+    root = tree.add({"task_id": "1"})
+    first = tree.add({"task_id": "1.1"}, root)
+    second = tree.add({"task_id": "1.1"}, root)
+    assert (first["task_id"], second["task_id"]) == ("1.1", "1.1-2")
+    assert tree.renamed == {"1.1-2": "1.1"}
+    assert "renaming it to 1.1-2" in caplog.text
+    assert root["subtasks"] == [first, second] and tree.parent(second) is root
+
+def test_link_indexes_follow_renames_and_aliases():
+    tree = TaskTree()
+    root = tree.add({"task_id": "1", "produces": [{"link_id": "out"}]})
+    tree.add({"task_id": "1", "ingests": [{"link_id": "out"}]}, root)  # Renamed to 1-2
+    assert tree.producers_of("out") == [root]
+    assert [task["task_id"] for task in tree.consumers_of("out")] == ["1-2"]
+
+    index = LinkIndex(lambda link_id: {"copy": "out"}.get(link_id, link_id))
+    index.add({"task_id": "a", "produces": [{"link_id": "out"}]})
+    index.add({"task_id": "b", "ingests": [{"link_id": "copy"}]})
+    assert index.consumers_of("out") == ["b"] and index.producers_of("copy") == ["a"]
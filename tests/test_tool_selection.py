@@ -0,0 +1,37 @@
+# tests/test_tool_selection.py
+import asyncio
+import llm_interaction
+from langchain_core.messages import AIMessage
+from rate_limiter import CircuitOpenError
+from schemas import Task
+
+SUBTASKS = [{"task_id": f"1.{index}", "task_name": f"Step {index}", "task_description": "", "ingests": [], "produces": []} for index in (1, 2)]
+
+def select(monkeypatch, individual: str, subtasks=SUBTASKS):
+    """Selects tools while the batched call fails; individual is 'ok', 'fails' or 'invalid'."""
+    calls = []
+
+    async def invoke(messages, call_type, use_cache=True, on_chunk=None):
+        calls.append(call_type)
+        if call_type == "select_batch" or individual == "fails":
+            raise CircuitOpenError("circuit open")
+        return AIMessage(content=f"Reasoning: simple\nAction: {'A' if individual == 'ok' else 'Z'}")
+
+    monkeypatch.setattr(llm_interaction, "a_invoke_model", invoke)
+    selected_tools = asyncio.run(llm_interaction.a_select_tools(subtasks, Task.model_json_schema(), 1, 3))
+    return selected_tools, calls
+
+def test_failed_batch_call_falls_back_to_individual_selection(monkeypatch):
+    selected_tools, calls = select(monkeypatch, "ok")
+    assert selected_tools == ["A", "A"]
+    assert calls == ["select_batch", "select", "select"]
+
+def test_failed_individual_selection_gets_fallback_tool(monkeypatch):
+    selected_tools, _ = select(monkeypatch, "fails")
+    assert selected_tools == [llm_interaction.SELECTION_FALLBACK_TOOL] * 2
+
+def test_invalid_individual_selection_gets_fallback_tool(monkeypatch):
+    selected_tools, _ = select(monkeypatch, "invalid")
+    assert selected_tools == [llm_interaction.SELECTION_FALLBACK_TOOL] * 2
+    selected_tools, calls = select(monkeypatch, "invalid", SUBTASKS[:1])  # A single sibling skips the batch
+    assert selected_tools == [llm_interaction.SELECTION_FALLBACK_TOOL] and calls == ["select"]
@@ -0,0 +1,58 @@
+# tests/test_vm_pool.py
+import asyncio
+import pytest
+from vm_pool import FakeInstanceProvider, VMPool
+
+class FlakyProvider(FakeInstanceProvider):
+    """Fails its first `failures` boots."""
+
+    def __init__(self, failures: int, boot_delay: float = 0.0):
+        super().__init__(boot_delay=boot_delay)
+        self.failures = failures
+
+    def start(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("boot failed")
+        return super().start()
+
+def test_lease_boots_on_demand_after_failed_prewarm():
+    async def main():
+        pool = VMPool(FlakyProvider(failures=2), size=2)
+        pool.start()
+        await asyncio.sleep(0.05)  # Both prewarm boots fail
+        try:
+            async with pool.lease() as instance:
+                return instance, pool.live
+        finally:
+            await pool.close()
+
+    instance, live = asyncio.run(main())
+    assert instance.id == "fake-1" and live == 1
+
+def test_waiting_lease_boots_itself_when_background_boot_fails():
+    async def main():
+        pool = VMPool(FlakyProvider(failures=1, boot_delay=0.05), size=1)
+        try:
+            async with pool.lease() as instance:  # Waits on the failing prewarm boot
+                return instance
+        finally:
+            await pool.close()
+
+    assert asyncio.run(main()).id == "fake-1"
+
+def test_failed_on_demand_boot_fails_only_its_lease():
+    async def main():
+        pool = VMPool(FlakyProvider(failures=2), size=1)
+        pool.start()
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(RuntimeError, match="VM failed to boot"):
+                async with pool.lease():
+                    pass
+            async with pool.lease() as instance:
+                return instance
+        finally:
+            await pool.close()
+
+    assert asyncio.run(main()).id == "fake-1"
@@ -1,8 +1,20 @@
 def print_task_tree(task, indent=""):
-    selected_tool = task.get('selected_tool', 'N/A')
-    print(f"{indent}Task: {task['task_name']} (Tool: {selected_tool})")
-    if 'subtasks' in task and task['subtasks']:
-        for subtask in task['subtasks']:
-            print_task_tree(subtask, indent + " ")
-    elif 'result' in task:
-        print(f"{indent} Result: {task['result']}")
\ No newline at end of file
+    """Prints a task and its subtasks, one line per task indented by depth (iterative, so deep trees are fine)."""
+    stack = [(task, indent)]
+    while stack:
+        task, indent = stack.pop()
+        selected_tool = task.get('selected_tool', 'N/A')
+        print(f"{indent}Task: {task['task_name']} (Tool: {selected_tool})")
+        if 'subtasks' in task and task['subtasks']:
+            stack.extend((subtask, indent + " ") for subtask in reversed(task['subtasks']))
+        elif 'result' in task:
+            print(f"{indent} Result: {task['result']}")
+
+
+def iter_tasks(root_task):
+    """Yields every task of a tree in depth-first pre-order."""
+    stack = [root_task]
+    while stack:
+        task = stack.pop()
+        yield task
+        stack.extend(reversed(task.get('subtasks') or []))
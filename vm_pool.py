@@ -0,0 +1,229 @@
+# vm_pool.py
+import asyncio
+import itertools
+import random
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from config import SCRAP_API_KEY, VM_POOL_SIZE, VM_POOL_MAX_LEASES, VM_TIMEOUT_HOURS, VM_RESET_COMMAND
+from journal import journal
+
+class ScrapybaraProvider:
+    """Instance provider backed by the Scrapybara SDK. All methods block and are run off the event loop.
+
+    model is the computer-use model shared by every conversation on the provider's instances."""
+
+    def __init__(self, api_key: str = SCRAP_API_KEY):
+        from scrapybara import Scrapybara
+        from scrapybara.anthropic import Anthropic
+        self.client = Scrapybara(api_key=api_key)
+        self.model = Anthropic()
+
+    def start(self) -> Any:
+        return self.client.start_ubuntu(timeout_hours=VM_TIMEOUT_HOURS)
+
+    def reset(self, instance: Any) -> bool:
+        """Closes whatever the previous lease left open; returns False if the instance is unusable."""
+        try:
+            instance.bash(command=VM_RESET_COMMAND)
+            return True
+        except Exception as e:
+            print(f"VM reset failed: {e}")
+            return False
+
+    def is_healthy(self, instance: Any) -> bool:
+        try:
+            instance.screenshot()
+            return True
+        except Exception:
+            return False
+
+    def stop(self, instance: Any):
+        instance.stop()
+
+class FakeInstance:
+    def __init__(self, instance_id: str):
+        self.id = instance_id
+        self.healthy = True
+        self.stopped = False
+        self.commands: List[str] = []
+
+class FakeInstanceProvider:
+    """Local stand-in for ScrapybaraProvider, for exercising the pool without booting real VMs.
+
+    boot_delay is in seconds (blocking, like the SDK); failure_rate is the chance a boot fails."""
+
+    def __init__(self, boot_delay: float = 0.0, failure_rate: float = 0.0):
+        self.client = None
+        self.model = None
+        self.boot_delay = boot_delay
+        self.failure_rate = failure_rate
+        self.started: List[FakeInstance] = []
+        self._ids = itertools.count(1)
+
+    def start(self) -> FakeInstance:
+        time.sleep(self.boot_delay)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Fake instance failed to boot")
+        instance = FakeInstance(f"fake-{next(self._ids)}")
+        self.started.append(instance)
+        return instance
+
+    def reset(self, instance: FakeInstance) -> bool:
+        instance.commands.append("reset")
+        return instance.healthy
+
+    def is_healthy(self, instance: FakeInstance) -> bool:
+        return instance.healthy and not instance.stopped
+
+    def stop(self, instance: FakeInstance):
+        instance.stopped = True
+
+class VMPool:
+    """Keeps `size` pre-booted instances warm and leases them to computer-use tasks.
+
+    Returned instances are reset and health-checked in the background; unhealthy instances and
+    instances that reached max_leases are stopped and replaced. Blocking SDK calls run in threads."""
+
+    def __init__(self, provider: Any = None, size: int = VM_POOL_SIZE, max_leases: int = VM_POOL_MAX_LEASES):
+        self.provider = provider
+        self.size = size
+        self.max_leases = max_leases
+        self.live = 0  # Booting, idle and leased instances
+        self.leases: Dict[int, int] = {}
+        self.closed = False
+        self._idle: Optional[asyncio.Queue] = None
+        self._boot_failed: Optional[asyncio.Event] = None  # Set, then replaced, whenever a background boot fails
+        self._background: set = set()
+
+    def start(self):
+        """Begins booting the warm instances; called automatically by the first lease."""
+        if self._idle is not None:
+            return
+        if self.provider is None:
+            self.provider = ScrapybaraProvider()
+        self._idle = asyncio.Queue()
+        self._boot_failed = asyncio.Event()
+        for _ in range(self.size):
+            self._spawn()
+
+    def _in_background(self, coroutine):
+        background_task = asyncio.create_task(coroutine)
+        self._background.add(background_task)
+        background_task.add_done_callback(self._background.discard)
+
+    def _spawn(self):
+        self.live += 1
+        self._in_background(self._boot())
+
+    async def _boot(self):
+        try:
+            instance = await asyncio.to_thread(self.provider.start)
+        except Exception as e:
+            self.live -= 1
+            print(f"VM failed to boot: {e}")
+            # Leases waiting for an instance boot one themselves now that there is room for it
+            self._boot_failed.set()
+            self._boot_failed = asyncio.Event()
+            return
+        self.leases[id(instance)] = 0
+        if self.closed:
+            await self._retire(instance, replace=False)
+        else:
+            self._idle.put_nowait(instance)
+
+    async def _boot_for_lease(self) -> Any:
+        """Boots an instance for the calling lease; a failed boot fails that lease only."""
+        self.live += 1
+        try:
+            instance = await asyncio.to_thread(self.provider.start)
+        except BaseException as e:
+            self.live -= 1
+            if isinstance(e, Exception):
+                raise RuntimeError(f"VM failed to boot: {e}") from e
+            raise
+        self.leases[id(instance)] = 0
+        return instance
+
+    async def _next_idle(self) -> Optional[Any]:
+        """Waits for an idle instance; returns None if a background boot failed meanwhile."""
+        getter = asyncio.ensure_future(self._idle.get())
+        failed = asyncio.ensure_future(self._boot_failed.wait())
+        try:
+            await asyncio.wait({getter, failed}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            if getter.done() and not getter.cancelled():
+                self._idle.put_nowait(getter.result())  # Do not lose an instance handed to a cancelled lease
+            raise
+        finally:
+            failed.cancel()
+            if not getter.done():
+                getter.cancel()
+        return getter.result() if getter.done() and not getter.cancelled() else None
+
+    async def _acquire(self) -> Any:
+        self.start()
+        while True:
+            if not self._idle.empty():
+                return self._idle.get_nowait()
+            if self.live < self.size:  # Nothing idle and room for one more: boot on demand
+                return await self._boot_for_lease()
+            instance = await self._next_idle()
+            if instance is not None:
+                return instance
+
+    async def _release(self, instance: Any):
+        self.leases[id(instance)] += 1
+        if self.closed or self.leases[id(instance)] >= self.max_leases:
+            await self._retire(instance, replace=not self.closed)
+            return
+        reset = await asyncio.to_thread(self.provider.reset, instance)
+        if reset and await asyncio.to_thread(self.provider.is_healthy, instance):
+            self._idle.put_nowait(instance)
+        else:
+            print("Retiring unhealthy VM instance")
+            await self._retire(instance, replace=True)
+
+    async def _retire(self, instance: Any, replace: bool):
+        self.live -= 1
+        self.leases.pop(id(instance), None)
+        try:
+            await asyncio.to_thread(self.provider.stop, instance)
+        except Exception as e:
+            print(f"Failed to stop VM instance: {e}")
+        if replace:
+            self._spawn()
+
+    @asynccontextmanager
+    async def lease(self):
+        """Yields a warm instance for the duration of a task."""
+        instance = await self._acquire()
+        try:
+            yield instance
+        finally:
+            self._in_background(self._release(instance))
+
+    async def close(self):
+        """Stops idle instances; leased and still-booting instances are stopped when they come back."""
+        self.closed = True
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            await self._retire(self._idle.get_nowait(), replace=False)
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, VMPool]" = weakref.WeakKeyDictionary()
+
+def get_vm_pool() -> VMPool:
+    """Returns the VM pool of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _pools:
+        _pools[loop] = VMPool(FakeInstanceProvider() if journal.replaying else None) # Replayed VM steps need no real instance
+    return _pools[loop]
+
+async def close_vm_pool():
+    """Stops the instances of the running event loop's pool, if any."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool:
+        await pool.close()